@@ -0,0 +1,57 @@
+import argparse
+import os
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the chunked wait time analytics on a synthetic history.')
+    parser.add_argument('--hospitals', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--per-hour', type=int, default=4, help='Readings per hospital per hour.')
+    parser.add_argument('--chunk-rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    # Runs against a scratch SQLite database unless DATABASE_URL points somewhere else
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='hospital-analytics-'), 'bench.db')}")
+    from src.database import engine, init_db, HospitalUrl, WaitTime
+    from src.analytics import summarize_wait_times, save_summary
+
+    init_db()
+    rng = np.random.default_rng(0)
+    start = datetime.now() - timedelta(days=args.days)
+    steps = args.days * 24 * args.per_hour
+    offsets = np.arange(steps) * (3600 // args.per_hour)
+    hours = (offsets // 3600) % 24
+    generated = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(HospitalUrl.__table__.insert(), [{'id': i, 'hospital_name': f'Hospital {i}',
+                                                       'hospital_url': f'https://h{i}.invalid'}
+                                                      for i in range(1, args.hospitals + 1)])
+        for hospital_id in range(1, args.hospitals + 1):
+            # Busier evenings, noise, and the odd spike
+            waits = 30 + 25 * np.sin((hours - 8) / 24 * 2 * np.pi) + rng.normal(0, 6, steps)
+            waits[rng.random(steps) < 0.001] += 180
+            conn.execute(WaitTime.__table__.insert(), [
+                {'hospital_id': hospital_id, 'wait_time': int(max(0, wait)),
+                 'fetched_at': start + timedelta(seconds=int(offset))}
+                for wait, offset in zip(waits, offsets)])
+    rows = args.hospitals * steps
+    print(f"Generated {rows} readings in {time.perf_counter() - generated:.1f}s")
+
+    started = time.perf_counter()
+    summary = summarize_wait_times(chunk_rows=args.chunk_rows)
+    summarized = time.perf_counter() - started
+    save_summary(summary)
+    total = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"Summarized {len(summary['hospitals'])} hospitals in {summarized:.2f}s "
+          f"({rows / summarized:,.0f} rows/sec), saved in {total - summarized:.2f}s")
+    print(f"{len(summary['anomalies'])} anomalies flagged, peak memory {peak_mb:.0f} MB")
+    print(summary['hospitals'].head().to_string())
+
+if __name__ == '__main__':
+    main()
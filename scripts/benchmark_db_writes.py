@@ -0,0 +1,59 @@
+import argparse
+import time
+from src.database import Session, Base, engine, HospitalUrl, WaitTime, LatestWaitTime, save_wait_time, BufferedWriter
+
+def create_hospital():
+    session = Session()
+    try:
+        hospital = HospitalUrl(hospital_name='Benchmark Hospital', hospital_url='https://benchmark.invalid')
+        session.add(hospital)
+        session.commit()
+        return hospital.id
+    finally:
+        session.close()
+
+def cleanup(hospital_id):
+    session = Session()
+    try:
+        # latest_wait_times references hospital_urls, so it goes before the hospital does
+        session.query(LatestWaitTime).filter(LatestWaitTime.hospital_id == hospital_id).delete()
+        session.query(WaitTime).filter(WaitTime.hospital_id == hospital_id).delete()
+        session.query(HospitalUrl).filter(HospitalUrl.id == hospital_id).delete()
+        session.commit()
+    finally:
+        session.close()
+
+def bench_per_row(hospital_id, rows):
+    start = time.perf_counter()
+    for i in range(rows):
+        save_wait_time(hospital_id, i % 240)
+    return time.perf_counter() - start
+
+def bench_buffered(hospital_id, rows, flush_rows):
+    start = time.perf_counter()
+    with BufferedWriter(flush_rows=flush_rows, flush_interval=float('inf')) as writer:
+        for i in range(rows):
+            writer.add_wait_time(hospital_id, i % 240)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-row and buffered wait time writes.')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--flush-rows', type=int, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    hospital_id = create_hospital()
+    try:
+        per_row = bench_per_row(hospital_id, args.rows)
+        buffered = bench_buffered(hospital_id, args.rows, args.flush_rows)
+    finally:
+        cleanup(hospital_id)
+
+    print(f"{'writer':>10} {'seconds':>9} {'rows/sec':>10}")
+    print(f"{'per-row':>10} {per_row:>9.2f} {args.rows / per_row:>10.0f}")
+    print(f"{'buffered':>10} {buffered:>9.2f} {args.rows / buffered:>10.0f}")
+    print(f"speedup: {per_row / buffered:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import glob
+import os
+import re
+import time
+from bs4 import BeautifulSoup
+from src.html_text import parse_page
+from src.parser import WAIT_TIME_KEYWORDS, extract_wait_times
+
+def synthetic_corpus(count):
+    filler = ''.join(f'<div class="card"><h3>Service {i}</h3><p>Lorem ipsum dolor sit amet {i}.</p>'
+                     f'<a href="/services/{i}">Learn more</a></div>' for i in range(300))
+    return [(f'<html><head><script>var x = {i};</script></head><body><nav>{filler}</nav>'
+             f'<section><h2>ER wait time</h2><p>Current wait time: {i % 90} minutes</p></section>'
+             f'<footer>{filler}</footer></body></html>') for i in range(count)]
+
+def load_corpus(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '**', '*.htm*'), recursive=True)):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+def bs4_pipeline(html):
+    # The previous approach: one soup per consumer and a full tree walk per keyword
+    soup = BeautifulSoup(html, 'html.parser')
+    wait_time = None
+    for keyword in WAIT_TIME_KEYWORDS:
+        for tag in soup.find_all(string=lambda text: text and keyword in text.lower()):
+            numbers = [int(s) for s in tag.parent.get_text(separator=' ', strip=True).split() if s.isdigit()]
+            if numbers:
+                wait_time = f"{numbers[0]} minutes"
+                break
+        if wait_time:
+            break
+    text = BeautifulSoup(html, 'html.parser').get_text(separator=' ')
+    matches = re.findall(r'\b(\d+)\s*(minutes?|hours?)\b', text, re.IGNORECASE)
+    return wait_time, len(matches)
+
+def lxml_pipeline(html):
+    page = parse_page(html, WAIT_TIME_KEYWORDS)
+    wait_time = extract_wait_times(page)
+    matches = re.findall(r'\b(\d+)\s*(minutes?|hours?)\b', page.text, re.IGNORECASE)
+    return wait_time, len(matches)
+
+def run(pipeline, pages):
+    start = time.perf_counter()
+    results = [pipeline(html) for html in pages]
+    return time.perf_counter() - start, results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the BeautifulSoup and single-pass lxml extraction paths.')
+    parser.add_argument('--corpus', help='Directory of saved hospital .html pages. Defaults to synthetic pages.')
+    parser.add_argument('--pages', type=int, default=50, help='Number of synthetic pages when no corpus is given.')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    size_mb = sum(len(html) for html in pages) / 1e6
+    print(f"{len(pages)} pages, {size_mb:.1f} MB")
+
+    bs4_seconds, bs4_results = run(bs4_pipeline, pages)
+    lxml_seconds, lxml_results = run(lxml_pipeline, pages)
+    agree = sum(1 for a, b in zip(bs4_results, lxml_results) if a[0] == b[0])
+
+    print(f"{'pipeline':>9} {'seconds':>9} {'pages/sec':>10} {'MB/sec':>8}")
+    print(f"{'bs4':>9} {bs4_seconds:>9.2f} {len(pages) / bs4_seconds:>10.1f} {size_mb / bs4_seconds:>8.1f}")
+    print(f"{'lxml':>9} {lxml_seconds:>9.2f} {len(pages) / lxml_seconds:>10.1f} {size_mb / lxml_seconds:>8.1f}")
+    print(f"speedup: {bs4_seconds / lxml_seconds:.1f}x, same wait time on {agree}/{len(pages)} pages")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Startup budget for importing the CLI, over a bare interpreter start
+STARTUP_BUDGET_MS = 300
+
+# Modules that must only be imported when a model backend is first used
+HEAVY_MODULES = ['torch', 'transformers', 'huggingface_hub', 'groq', 'ollama']
+
+CHECK_HEAVY = """
+import sys
+import {module}
+loaded = [name for name in {heavy!r} if name in sys.modules]
+if loaded:
+    print(','.join(loaded))
+"""
+
+def time_command(code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that importing the scraper stays fast and side-effect free.')
+    parser.add_argument('--module', default='src.main')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+
+    baseline = time_command('pass', args.runs)
+    total = time_command(f'import {args.module}', args.runs)
+    import_ms = total - baseline
+    print(f"interpreter: {baseline:.1f} ms, import {args.module}: {import_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    result = subprocess.run([sys.executable, '-c', CHECK_HEAVY.format(module=args.module, heavy=HEAVY_MODULES)],
+                            check=True, capture_output=True, text=True)
+    heavy = result.stdout.strip()
+    if heavy:
+        print(f"FAIL: importing {args.module} loaded {heavy}")
+        sys.exit(1)
+    if import_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import random
+import time
+from src.local_model import LocalModel, MISTRAL_MODEL
+
+SAMPLE_LINES = [
+    'Emergency Department',
+    'Current ER wait time: {minutes} min',
+    'Updated at {hour}:{minute:02d} PM',
+    'Urgent care is open 8am to 8pm every day.',
+    'Call 911 if you are having a medical emergency.',
+    'Visit our patient portal to schedule an appointment.',
+]
+
+def make_prompts(count, seed=0):
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(count):
+        lines = [rng.choice(SAMPLE_LINES).format(minutes=rng.randint(5, 240), hour=rng.randint(1, 12),
+                                                  minute=rng.randint(0, 59))
+                 for _ in range(rng.randint(3, 40))]
+        prompts.append('Extract the ER wait time from this page:\n' + '\n'.join(lines))
+    return prompts
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare local model throughput across batch sizes.')
+    parser.add_argument('--model', default=MISTRAL_MODEL)
+    parser.add_argument('--device', default=None, help='cpu, cuda or mps. Defaults to the best available.')
+    parser.add_argument('--quantize', action='store_true', help='Use dynamic int8 quantization (cpu only).')
+    parser.add_argument('--batch-sizes', default='1,2,4,8')
+    parser.add_argument('--prompts', type=int, default=32)
+    parser.add_argument('--max-new-tokens', type=int, default=32)
+    args = parser.parse_args()
+
+    prompts = make_prompts(args.prompts)
+    model = LocalModel(args.model, device=args.device, quantize=args.quantize)
+    model.load()
+    # Warm up so the first measured batch doesn't pay for kernel compilation and caches
+    model.generate_batch(prompts[:1], args.max_new_tokens)
+
+    print(f"{'batch':>5} {'seconds':>9} {'tokens':>7} {'tokens/sec':>11} {'prompts/sec':>12}")
+    for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        model.batch_size = batch_size
+        model.tokens_generated = 0
+        model.generation_seconds = 0.0
+        start = time.perf_counter()
+        model.generate_batch(prompts, args.max_new_tokens)
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>5} {elapsed:>9.2f} {model.tokens_generated:>7} "
+              f"{model.tokens_per_second():>11.1f} {len(prompts) / elapsed:>12.2f}")
+
+if __name__ == '__main__':
+    main()
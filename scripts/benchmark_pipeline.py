@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import resource
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Per-stage latencies in seconds, appended from worker threads
+timings = defaultdict(list)
+
+def timed(stage, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+    return wrapper
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def wait_minutes(hospital_id):
+    return (hospital_id * 37) % 180 + 5
+
+def hospital_page(hospital_id, page):
+    """
+    HTML for a stub hospital site. Wait time pages rotate between a clearly labelled
+    value (fast path), a phrase only the LLM resolves, and an hours + minutes label.
+    """
+    links = (f'<nav><a href="/h/{hospital_id}/">Home</a> <a href="/h/{hospital_id}/about">About us</a> '
+             f'<a href="/h/{hospital_id}/emergency/wait-times">ER Wait Times</a></nav>')
+    footer = '<footer>&copy; 2024 Stub Health. All rights reserved. <a href="/privacy">Privacy Policy</a></footer>'
+    minutes = wait_minutes(hospital_id)
+    if page == '':
+        body = '<h1>Welcome to Stub Hospital</h1><p>Compassionate care close to home.</p>'
+    elif page == 'about':
+        body = '<h1>About us</h1>' + '<p>Serving the community since 1901.</p>' * 20
+    elif page == 'emergency/wait-times':
+        style = hospital_id % 3
+        if style == 0:
+            body = f'<h1>Emergency</h1><p>ER Wait Time: {minutes} min</p>'
+        elif style == 1:
+            body = (f'<h1>Emergency wait times</h1><p>Updated 10:45 AM</p>'
+                    + '<p>Our team triages patients by severity.</p>' * 5
+                    + f'<p>Patients are currently being seen within {minutes} minutes of arrival.</p>')
+        else:
+            body = f'<h1>Emergency</h1><p>Current wait: {minutes // 60} hr {minutes % 60} min</p>'
+    else:
+        return None
+    return f'<html><head><title>Stub Hospital {hospital_id}</title></head><body>{links}{body}{footer}</body></html>'
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='text/html; charset=utf-8'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _page(self, path):
+        match = re.fullmatch(r'/h/(\d+)/?(.*?)/?', path)
+        return hospital_page(int(match.group(1)), match.group(2)) if match else None
+
+    def do_GET(self):
+        from src.html_text import parse_page
+        path = self.path.split('?', 1)[0]
+        if path == '/robots.txt':
+            return self._send(200, 'User-agent: *\nAllow: /\n', 'text/plain')
+        if path.startswith('/reader/'):
+            # Stand-in for r.jina.ai: return the target page as plain text
+            target = re.sub(r'^https?://[^/]+', '', self.path[len('/reader/'):])
+            html = self._page(target.split('?', 1)[0])
+            if html is None:
+                return self._send(404, 'Not found', 'text/plain')
+            return self._send(200, parse_page(html).text, 'text/plain; charset=utf-8')
+        html = self._page(path)
+        if html is None:
+            return self._send(404, '<html><body>Not found</body></html>')
+        self._send(200, html)
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the scraping pipeline end to end, offline, and report speed and accuracy.')
+    parser.add_argument('--hospitals', type=int, default=60, help='Number of stub hospitals.')
+    parser.add_argument('--replay', metavar='DIR', help='Replay a recorded corpus instead of the stub sites.')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds per fake LLM call.')
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='hospital-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    # The fake model is registered as groq, keep the LLM router from also trying a local Ollama
+    os.environ.setdefault('LLM_PROVIDERS', 'groq')
+    logging.basicConfig(filename=os.path.join(workdir, 'bench.log'), level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Imported after DATABASE_URL is set so the engine points at the scratch database
+    from src import main as pipeline, database, fetcher, fast_extractor, replay, backends, wait_time_store
+    from src import searcher, crawler
+    from src.extraction_cache import extraction_cache
+    from src.page_cache import PageCache
+
+    # Start from empty caches so every run measures the same work
+    fetcher.page_cache = PageCache(os.path.join(workdir, 'pages'))
+    extraction_cache.path = os.path.join(workdir, 'extractions.sqlite')
+    fast_extractor.domain_patterns.path = os.path.join(workdir, 'learned_patterns.json')
+
+    if args.replay:
+        corpus = replay.install('replay', args.replay)
+        hospitals = corpus.load_hospitals()
+        labels = corpus.load_labels()
+        truth = {hospital_id: labels.get(url) for hospital_id, _, url in hospitals if url in labels}
+    else:
+        server = start_stub_server()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        fetcher.JINA_READER = f"{base}/reader/"
+        hospitals = [(i, f'Stub Hospital {i}', f'{base}/h/{i}') for i in range(1, args.hospitals + 1)]
+        truth = {i: wait_minutes(i) for i, _, _ in hospitals}
+
+        def fake_extraction(text):
+            # Stands in for the model reading context the fast path can't, e.g. "seen within N minutes"
+            result = fast_extractor.extract_wait_time(text)
+            seen_within = re.search(r'seen within (\d+) minutes', text)
+            if seen_within:
+                result = {'wait_time_minutes': int(seen_within.group(1)), 'snippet': seen_within.group(0)}
+            return {'wait_time_minutes': result['wait_time_minutes'] if result else None,
+                    'confidence': 0.9 if result else 0,
+                    'source_snippet': result['snippet'] if result else None}
+
+        class FakeLLM(backends.Backend):
+            name = 'groq'
+            model = backends.GroqBackend.model
+
+            def complete(self, text, system_prompt, max_tokens):
+                time.sleep(args.llm_latency)
+                # Batched requests list pages under "### Page <id>" headings and get one result per id
+                sections = re.split(r'^### Page (\d+) .*$', text, flags=re.MULTILINE)
+                if len(sections) > 1:
+                    return json.dumps({sections[i]: fake_extraction(sections[i + 1])
+                                       for i in range(1, len(sections), 2)})
+                return json.dumps(fake_extraction(text))
+
+        backends.register_backend('groq', FakeLLM)
+        backends.reset_backends()
+
+    database.init_db()
+    session = database.Session()
+    session.add_all([database.HospitalUrl(id=i, hospital_name=name, hospital_url=url) for i, name, url in hospitals])
+    session.commit()
+    session.close()
+
+    searcher.search_site = timed('search', searcher.search_site)
+    crawler.crawl_site = timed('crawl', crawler.crawl_site)
+    fetcher.fetch_page_jina = timed('fetch', fetcher.fetch_page_jina)
+    database.BufferedWriter.flush = timed('db_write', database.BufferedWriter.flush)
+    llm = backends.get_backend('groq')
+    llm.complete = timed('llm', llm.complete)
+
+    start = time.perf_counter()
+    asyncio.run(pipeline.main_async(args.concurrency, per_host_concurrency=args.concurrency, per_host_interval=0))
+    elapsed = time.perf_counter() - start
+
+    latest = {row['hospital_id']: row['wait_time'] for row in wait_time_store.latest_wait_times()}
+    correct = sum(1 for hospital_id, minutes in truth.items() if latest.get(hospital_id) == minutes)
+    pages = len(timings['fetch'])
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"\n{len(hospitals)} hospitals, {pages} pages in {elapsed:.2f}s: "
+          f"{pages / elapsed:.1f} pages/sec, {len(hospitals) / elapsed:.2f} hospitals/sec")
+    print(f"{'stage':>9} {'calls':>6} {'p50 ms':>9} {'p99 ms':>9} {'total s':>9}")
+    for stage in ('search', 'crawl', 'fetch', 'llm', 'db_write'):
+        values = timings[stage]
+        if values:
+            print(f"{stage:>9} {len(values):>6} {percentile(values, 50) * 1000:>9.1f} "
+                  f"{percentile(values, 99) * 1000:>9.1f} {sum(values):>9.2f}")
+    print(f"peak memory: {peak_mb:.0f} MB")
+    if truth:
+        print(f"accuracy: {correct}/{len(truth)} hospitals ({correct / len(truth):.0%}) match ground truth")
+    print(f"scratch data and log: {workdir}")
+
+if __name__ == '__main__':
+    main()
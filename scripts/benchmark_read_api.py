@@ -0,0 +1,78 @@
+import argparse
+import http.client
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+def client(port, hospitals, requests, latencies, statuses, bulk_share):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    etags = {}
+    for _ in range(requests):
+        path = '/wait-times' if random.random() < bulk_share else f'/wait-times/{random.randint(1, hospitals)}'
+        headers = {'Accept-Encoding': 'gzip'}
+        if path in etags:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        # Half the clients revalidate, like dashboards polling with a cache
+        if random.random() < 0.5 and response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the read API against a synthetic snapshot.')
+    parser.add_argument('--hospitals', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per client.')
+    parser.add_argument('--bulk-share', type=float, default=0.01, help='Fraction of requests for the bulk endpoint.')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='hospital-api-'), 'bench.db')}")
+    from src.database import engine, init_db, HospitalUrl, LatestWaitTime
+    from src.read_api import serve
+
+    init_db()
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(HospitalUrl.__table__.insert(), [{'id': i, 'hospital_name': f'Hospital {i}',
+                                                       'hospital_url': f'https://h{i}.invalid'}
+                                                      for i in range(1, args.hospitals + 1)])
+        conn.execute(LatestWaitTime.__table__.insert(), [{'hospital_id': i, 'wait_time': random.randint(0, 240),
+                                                          'fetched_at': now} for i in range(1, args.hospitals + 1)])
+
+    started = time.perf_counter()
+    server, snapshot = serve(0)
+    print(f"Loaded {len(snapshot.records)} hospitals in {time.perf_counter() - started:.2f}s, "
+          f"bulk response {len(snapshot.bulk.data)} bytes, {len(snapshot.bulk.gzipped)} gzipped")
+
+    port = server.server_address[1]
+    latencies, statuses = [], {}
+    threads = [threading.Thread(target=client, args=(port, args.hospitals, args.requests, latencies, statuses,
+                                                     args.bulk_share))
+               for _ in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    total = len(latencies)
+    print(f"{total} requests from {args.clients} clients in {elapsed:.2f}s: {total / elapsed:,.0f} requests/sec")
+    print(f"latency p50 {percentile(latencies, 50) * 1000:.3f} ms, p99 {percentile(latencies, 99) * 1000:.3f} ms")
+    print(f"statuses: {dict(sorted(statuses.items()))}")
+
+if __name__ == '__main__':
+    main()
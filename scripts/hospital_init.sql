@@ -1,12 +1,22 @@
+drop table if exists discovered_urls cascade;
+drop table if exists wait_time_seasonality cascade;
+drop table if exists wait_time_summaries cascade;
+drop table if exists latest_wait_times cascade;
 drop table if exists wait_times cascade;
 drop table if exists web_pages cascade;
+drop table if exists page_bodies cascade;
 drop table if exists hospital_urls cascade;
 CREATE TABLE hospital_urls (
     id SERIAL PRIMARY KEY,
     hospital_name VARCHAR(255) NOT NULL,
     hospital_url TEXT NOT NULL,
     last_fetched TIMESTAMP,
-    status VARCHAR(50)
+    status VARCHAR(50),
+    next_fetch_at TIMESTAMP,
+    refresh_interval INTEGER,
+    result_signature VARCHAR(64),
+    lease_owner VARCHAR(255),
+    lease_expires_at TIMESTAMP
 );
 
 CREATE TABLE wait_times (
@@ -17,16 +27,81 @@ CREATE TABLE wait_times (
     FOREIGN KEY (hospital_id) REFERENCES hospital_urls (id)
 );
 
+CREATE INDEX ix_wait_times_hospital_id_fetched_at ON wait_times (hospital_id, fetched_at);
+CREATE INDEX ix_wait_times_fetched_at ON wait_times (fetched_at);
+
+CREATE TABLE latest_wait_times (
+    hospital_id INTEGER PRIMARY KEY,
+    wait_time INTEGER NOT NULL,
+    fetched_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (hospital_id) REFERENCES hospital_urls (id)
+);
+
+CREATE TABLE wait_time_summaries (
+    hospital_id INTEGER PRIMARY KEY,
+    period_start TIMESTAMP NOT NULL,
+    period_end TIMESTAMP NOT NULL,
+    samples INTEGER NOT NULL,
+    mean FLOAT,
+    p50 FLOAT,
+    p90 FLOAT,
+    p95 FLOAT,
+    min FLOAT,
+    max FLOAT,
+    rolling_median FLOAT,
+    anomalies INTEGER NOT NULL DEFAULT 0,
+    computed_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (hospital_id) REFERENCES hospital_urls (id)
+);
+
+CREATE TABLE wait_time_seasonality (
+    hospital_id INTEGER NOT NULL,
+    hour_of_week INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    median FLOAT NOT NULL,
+    PRIMARY KEY (hospital_id, hour_of_week),
+    FOREIGN KEY (hospital_id) REFERENCES hospital_urls (id)
+);
+
+CREATE TABLE discovered_urls (
+    id SERIAL PRIMARY KEY,
+    hospital_id INTEGER NOT NULL,
+    page_url TEXT NOT NULL,
+    confidence FLOAT NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    discovered_at TIMESTAMP NOT NULL,
+    last_verified TIMESTAMP,
+    FOREIGN KEY (hospital_id) REFERENCES hospital_urls (id),
+    CONSTRAINT uq_discovered_urls_hospital_id_page_url UNIQUE (hospital_id, page_url)
+);
+
+CREATE INDEX ix_discovered_urls_hospital_id ON discovered_urls (hospital_id);
+
+CREATE TABLE page_bodies (
+    content_hash VARCHAR(64) PRIMARY KEY,
+    encoding VARCHAR(10) NOT NULL,
+    raw_size INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    base_hash VARCHAR(64),
+    chain_depth INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL
+);
+
 CREATE TABLE web_pages (
     id SERIAL PRIMARY KEY,
     hospital_id INTEGER NOT NULL,
     page_url TEXT NOT NULL,
     content TEXT,
+    content_hash VARCHAR(64),
     relevance_score FLOAT,
     fetched_at TIMESTAMP NOT NULL,
-    FOREIGN KEY (hospital_id) REFERENCES hospital_urls (id)
+    FOREIGN KEY (hospital_id) REFERENCES hospital_urls (id),
+    FOREIGN KEY (content_hash) REFERENCES page_bodies (content_hash)
 );
 
+CREATE INDEX ix_web_pages_content_hash ON web_pages (content_hash);
+CREATE INDEX ix_web_pages_page_url_id ON web_pages (page_url, id);
+
 
 
 INSERT INTO hospital_urls (id, hospital_name, hospital_url) VALUES
@@ -0,0 +1,140 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stands in for an Ollama server (POST /api/chat) so the LLM router can be exercised offline:
+# answers are read from the prompt with a regex, and latency, throttling and errors are configurable.
+
+WAIT_TIME = re.compile(r'(\d{1,3})\s*(?:min(?:ute)?s?|mins)\b|(\d{1,2})\s*(?:hours?|hrs?)\b', re.IGNORECASE)
+PAGE_HEADING = re.compile(r'^### Page (\d+) .*$', re.MULTILINE)
+
+def extract(text):
+    match = WAIT_TIME.search(text)
+    if match is None:
+        return {'wait_time_minutes': None, 'confidence': 0, 'source_snippet': None}
+    minutes = int(match.group(1)) if match.group(1) else int(match.group(2)) * 60
+    return {'wait_time_minutes': minutes, 'confidence': 0.8, 'source_snippet': match.group(0)}
+
+def answer(text):
+    # Batched prompts list pages under "### Page <id>" headings and get one result per id
+    sections = PAGE_HEADING.split(text)
+    if len(sections) > 1:
+        return json.dumps({sections[i]: extract(sections[i + 1]) for i in range(1, len(sections), 2)})
+    return json.dumps(extract(text))
+
+class RateLimiter:
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def retry_after(self):
+        """
+        Returns None if the request is allowed, else seconds until it would be.
+        """
+        if not self.rpm:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if len(self.recent) >= self.rpm:
+                return 60 - (now - self.recent[0])
+            self.recent.append(now)
+            return None
+
+def make_handler(args, limiter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path != '/api/chat':
+                self._send(404, {'error': 'not found'})
+                return
+            retry_after = limiter.retry_after()
+            if retry_after is not None:
+                self._send(429, {'error': 'rate limited'}, {'Retry-After': str(max(1, round(retry_after)))})
+                return
+            if random.random() < args.error_rate:
+                self._send(503, {'error': 'model unavailable'})
+                return
+            time.sleep(max(0.0, random.gauss(args.latency, args.jitter)))
+
+            text = ''.join(message['content'] for message in request.get('messages', [])
+                           if message.get('role') == 'user')
+            content = answer(text)
+            model = request.get('model', 'stub')
+            if not request.get('stream', True):
+                self._send(200, {'model': model, 'message': {'role': 'assistant', 'content': content}, 'done': True})
+                return
+
+            # Ollama's streaming format: one JSON object per line, ending with "done": true
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+            lines = [{'model': model, 'message': {'role': 'assistant', 'content': piece}, 'done': False}
+                     for piece in pieces]
+            lines.append({'model': model, 'message': {'role': 'assistant', 'content': ''}, 'done': True})
+            try:
+                for line in lines:
+                    data = json.dumps(line).encode() + b'\n'
+                    self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                    self.wfile.flush()
+                    time.sleep(args.token_delay)
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading, e.g. once its JSON object was complete
+                pass
+
+    return Handler
+
+def start_server(port=0, latency=0.2, jitter=0.05, token_delay=0.0, rpm=0, error_rate=0.0, host='127.0.0.1'):
+    """
+    Starts the stand-in server on a background thread and returns it. port=0 picks a free port.
+    """
+    args = argparse.Namespace(latency=latency, jitter=jitter, token_delay=token_delay, error_rate=error_rate)
+    server = ThreadingHTTPServer((host, port), make_handler(args, RateLimiter(rpm)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='llm-stub-server', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve an Ollama-compatible stand-in model for offline runs.')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.2, help='Mean seconds before the first token.')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Standard deviation of the latency.')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='Seconds between streamed chunks.')
+    parser.add_argument('--rpm', type=int, default=0, help='Answer 429 beyond this many requests a minute.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503.')
+    args = parser.parse_args()
+    server = start_server(args.port, args.latency, args.jitter, args.token_delay, args.rpm, args.error_rate)
+    print(f"Stand-in model listening on http://127.0.0.1:{server.server_address[1]}, "
+          f"point OLLAMA_URL at it and set LLM_PROVIDERS=ollama")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
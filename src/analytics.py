@@ -0,0 +1,167 @@
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, delete, insert
+from .database import get_engine, WaitTime, WaitTimeSummary, WaitTimeSeasonality
+
+logger = logging.getLogger(__name__)
+
+# Rows read from the database per chunk
+CHUNK_ROWS = 500000
+
+# Window of the rolling median, as a pandas offset
+ROLLING_WINDOW = '24h'
+
+# A reading is an anomaly when it is more than this many robust standard deviations
+# (1.4826 * median absolute deviation) away from the hospital's median for that hour of the week
+ANOMALY_THRESHOLD = 3.5
+MAD_SCALE = 1.4826
+# Floor for the deviation scale in minutes, so hospitals with near-constant waits don't flag every change
+MIN_SCALE = 5.0
+
+def iter_hospital_frames(start=None, end=None, hospital_ids=None, chunk_rows=CHUNK_ROWS):
+    """
+    Streams wait_times as DataFrames of whole hospitals, ordered by (hospital_id, fetched_at).
+
+    Rows are read chunk_rows at a time through the (hospital_id, fetched_at)
+    index. The last hospital of each chunk is held back until its remaining
+    rows arrive, so every frame holds complete histories and memory is bounded
+    by the chunk size plus the longest single history.
+    """
+    table = WaitTime.__table__
+    query = (select(table.c.hospital_id, table.c.fetched_at, table.c.wait_time)
+             .order_by(table.c.hospital_id, table.c.fetched_at))
+    if start is not None:
+        query = query.where(table.c.fetched_at >= start)
+    if end is not None:
+        query = query.where(table.c.fetched_at < end)
+    if hospital_ids is not None:
+        query = query.where(table.c.hospital_id.in_(list(hospital_ids)))
+
+    carry = None
+    with get_engine().connect() as conn:
+        conn = conn.execution_options(stream_results=True, yield_per=chunk_rows)
+        for chunk in pd.read_sql(query, conn, chunksize=chunk_rows, parse_dates=['fetched_at'],
+                                 dtype={'hospital_id': 'int32', 'wait_time': 'float32'}):
+            if carry is not None and len(carry):
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            hospital_ids_sorted = chunk['hospital_id'].to_numpy()
+            split = int(np.searchsorted(hospital_ids_sorted, hospital_ids_sorted[-1], side='left'))
+            carry = chunk.iloc[split:]
+            if split:
+                yield chunk.iloc[:split].reset_index(drop=True)
+    if carry is not None and len(carry):
+        yield carry.reset_index(drop=True)
+
+def summarize_frame(frame, rolling_window=ROLLING_WINDOW, threshold=ANOMALY_THRESHOLD):
+    """
+    Computes summaries for every hospital in a frame of complete, sorted histories.
+
+    Returns:
+        tuple: (per-hospital stats, hour-of-week seasonality, anomalous readings) as DataFrames.
+    """
+    hospital_ids = frame['hospital_id'].to_numpy()
+    waits = frame['wait_time'].to_numpy(dtype='float64')
+    timestamps = frame['fetched_at']
+    hour_of_week = (timestamps.dt.dayofweek.to_numpy() * 24 + timestamps.dt.hour.to_numpy()).astype('int16')
+
+    grouped = frame.groupby('hospital_id', sort=False)
+    stats = grouped['wait_time'].agg(samples='count', mean='mean', min='min', max='max')
+    periods = grouped['fetched_at'].agg(period_start='min', period_end='max')
+    quantiles = grouped['wait_time'].quantile([0.5, 0.9, 0.95]).unstack()
+    quantiles.columns = ['p50', 'p90', 'p95']
+    stats = stats.join(periods).join(quantiles)
+
+    # Expected wait for each reading is its hospital's median for that hour of the week
+    keys = pd.MultiIndex.from_arrays([hospital_ids, hour_of_week], names=['hospital_id', 'hour_of_week'])
+    seasonal = pd.Series(waits, index=keys).groupby(level=[0, 1]).agg(['median', 'count'])
+    expected = seasonal['median'].reindex(keys).to_numpy()
+    residual = waits - expected
+    mad = pd.Series(np.abs(residual)).groupby(hospital_ids).transform('median').to_numpy()
+    score = residual / np.maximum(MAD_SCALE * mad, MIN_SCALE)
+    is_anomaly = np.abs(score) > threshold
+    stats['anomalies'] = pd.Series(is_anomaly).groupby(hospital_ids).sum().astype(int)
+
+    # Time-based rolling median per hospital; frames are sorted by hospital then time, so rows line up
+    rolling = (frame.set_index('fetched_at').groupby('hospital_id', sort=False)['wait_time']
+               .rolling(rolling_window).median())
+    stats['rolling_median'] = pd.Series(rolling.to_numpy(), index=hospital_ids).groupby(level=0).last()
+
+    anomalies = pd.DataFrame({'hospital_id': hospital_ids[is_anomaly], 'fetched_at': timestamps.to_numpy()[is_anomaly],
+                              'wait_time': waits[is_anomaly], 'expected': expected[is_anomaly],
+                              'score': score[is_anomaly]})
+    seasonal = seasonal.rename(columns={'count': 'samples'}).reset_index()
+    return stats.reset_index(), seasonal, anomalies
+
+def summarize_wait_times(start=None, end=None, hospital_ids=None, chunk_rows=CHUNK_ROWS):
+    """
+    Computes per-hospital wait time statistics over a period, reading the history in chunks.
+
+    Args:
+        start (datetime, optional): First reading to include.
+        end (datetime, optional): Readings before this time are included.
+        hospital_ids (list, optional): Only these hospitals.
+        chunk_rows (int): Rows read per database round trip.
+
+    Returns:
+        dict: 'hospitals' (samples, mean, min, max, p50/p90/p95, rolling_median, anomalies per hospital),
+        'seasonality' (median and samples per hospital and hour of week, 0 = Monday 00:00) and
+        'anomalies' (the flagged readings with their expected value and score), as DataFrames.
+    """
+    hospitals, seasonality, anomalies = [], [], []
+    for frame in iter_hospital_frames(start, end, hospital_ids, chunk_rows):
+        stats, seasonal, flagged = summarize_frame(frame)
+        hospitals.append(stats)
+        seasonality.append(seasonal)
+        anomalies.append(flagged)
+    if not hospitals:
+        return {'hospitals': pd.DataFrame(), 'seasonality': pd.DataFrame(), 'anomalies': pd.DataFrame()}
+    return {'hospitals': pd.concat(hospitals, ignore_index=True),
+            'seasonality': pd.concat(seasonality, ignore_index=True),
+            'anomalies': pd.concat(anomalies, ignore_index=True)}
+
+def _records(frame, columns):
+    # Plain Python values, the database drivers don't take numpy scalars
+    return [{column: (None if pd.isna(value) else value.item() if hasattr(value, 'item') else value)
+             for column, value in zip(columns, row)}
+            for row in frame[columns].itertuples(index=False, name=None)]
+
+def save_summary(summary):
+    """
+    Replaces the stored summaries of the summarized hospitals with summary's.
+    """
+    hospitals = summary['hospitals']
+    if hospitals.empty:
+        return 0
+    hospital_ids = [int(hospital_id) for hospital_id in hospitals['hospital_id']]
+    stats = hospitals.assign(computed_at=datetime.now())
+    stat_columns = ['hospital_id', 'period_start', 'period_end', 'samples', 'mean', 'p50', 'p90', 'p95',
+                    'min', 'max', 'rolling_median', 'anomalies', 'computed_at']
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(delete(WaitTimeSummary.__table__).where(WaitTimeSummary.hospital_id.in_(hospital_ids)))
+            conn.execute(delete(WaitTimeSeasonality.__table__)
+                         .where(WaitTimeSeasonality.hospital_id.in_(hospital_ids)))
+            conn.execute(insert(WaitTimeSummary.__table__), _records(stats, stat_columns))
+            conn.execute(insert(WaitTimeSeasonality.__table__),
+                         _records(summary['seasonality'], ['hospital_id', 'hour_of_week', 'samples', 'median']))
+        logger.info(f"Saved wait time summaries for {len(hospital_ids)} hospitals")
+        return len(hospital_ids)
+    except Exception as e:
+        logger.error(f"Failed to save wait time summaries: {e}")
+        return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute wait time summaries for every hospital.')
+    parser.add_argument('--days', type=int, default=365, help='Length of history to summarize.')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    summary = summarize_wait_times(start=datetime.now() - timedelta(days=args.days), chunk_rows=args.chunk_rows)
+    saved = save_summary(summary)
+    print(f"Summarized {len(summary['hospitals'])} hospitals, {len(summary['anomalies'])} anomalies, "
+          f"saved {saved}, in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Registered factories by name, and the instances created from them on first use
+_factories = {}
+_instances = {}
+_lock = threading.Lock()
+
+class Backend:
+    """
+    A model that completes a prompt.
+
+    Subclasses import their client libraries and read credentials in __init__,
+    which only runs the first time get_backend() asks for them.
+    """
+
+    name = None
+    model = None
+
+    def complete(self, text, system_prompt, max_tokens):
+        raise NotImplementedError
+
+    def stream(self, text, system_prompt, max_tokens, json_mode=False):
+        """
+        Yields the completion in chunks as they are generated. Closing the generator
+        stops generation. Backends that can't stream yield the whole completion once.
+        """
+        yield self.complete(text, system_prompt, max_tokens)
+
+def register_backend(name, factory):
+    """
+    Registers a zero-argument factory that builds the backend called name.
+    """
+    _factories[name] = factory
+
+def get_factory(name):
+    return _factories[name]
+
+def get_backend(name):
+    """
+    Returns the backend called name, creating it the first time it is asked for.
+    """
+    backend = _instances.get(name)
+    if backend is not None:
+        return backend
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"No model backend registered as {name!r}")
+            logger.info(f"Initializing model backend {name}")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+def reset_backends():
+    with _lock:
+        _instances.clear()
+
+class GroqBackend(Backend):
+    name = 'groq'
+    model = "llama3-8b-8192"
+
+    def __init__(self):
+        from groq import Groq
+        from .config import groq_token
+        self.client = Groq(api_key=groq_token)
+
+    def _messages(self, text, system_prompt):
+        return [
+            {
+                "role": "user",
+                "content": text
+            },
+            {
+                "role": "system",
+                "content": system_prompt
+            }
+        ]
+
+    def complete(self, text, system_prompt, max_tokens):
+        completion = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(text, system_prompt),
+            temperature=0,
+            max_tokens=max_tokens,
+            top_p=1,
+            stream=False,
+            stop=None,
+        )
+        return completion.choices[0].message.content
+
+    def stream(self, text, system_prompt, max_tokens, json_mode=False):
+        # JSON mode makes Groq reject completions that aren't a single JSON object
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(text, system_prompt),
+            temperature=0,
+            max_tokens=max_tokens,
+            top_p=1,
+            stream=True,
+            stop=None,
+            **extra,
+        )
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        finally:
+            # Closes the HTTP response, so a caller that stops reading stops paying for tokens
+            stream.close()
+
+class MistralBackend(Backend):
+    name = 'mistral'
+
+    def __init__(self):
+        from huggingface_hub import login
+        from .config import huggingface_token
+        from .local_model import LocalModel, BatchQueue, MISTRAL_MODEL
+        login(token=huggingface_token)
+        self.model = MISTRAL_MODEL
+        # Pages from every caller share batched forward passes through the queue
+        self.queue = BatchQueue(LocalModel(MISTRAL_MODEL))
+
+    def complete(self, text, system_prompt, max_tokens):
+        return self.queue.submit(f"{system_prompt}\n{text}", max_tokens).result()
+
+class OllamaBackend(Backend):
+    """
+    A model served by Ollama, or anything speaking its /api/chat protocol
+    (e.g. scripts/llm_stub_server.py), at OLLAMA_URL.
+    """
+    name = 'ollama'
+    model = os.environ.get('OLLAMA_MODEL', 'llama3:8b')
+
+    # Local generation is slow on CPU, so reads get much longer than the scraping timeouts
+    READ_TIMEOUT = 120
+
+    def __init__(self):
+        from . import http_client
+        self.url = os.environ.get('OLLAMA_URL', 'http://localhost:11434').rstrip('/') + '/api/chat'
+        # Own session without retries, the router decides where a failed request goes next
+        self.session = http_client.build_session(retries=0)
+        self.timeout = (http_client.CONNECT_TIMEOUT, self.READ_TIMEOUT)
+
+    def _payload(self, text, system_prompt, max_tokens, stream, json_mode=False):
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text},
+            ],
+            "stream": stream,
+            "options": {"temperature": 0, "num_predict": max_tokens},
+        }
+        if json_mode:
+            payload["format"] = "json"
+        return payload
+
+    def complete(self, text, system_prompt, max_tokens):
+        response = self.session.post(self.url, json=self._payload(text, system_prompt, max_tokens, False),
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["message"]["content"]
+
+    def stream(self, text, system_prompt, max_tokens, json_mode=False):
+        # Ollama streams one JSON object per line, the last one has "done": true
+        response = self.session.post(self.url, json=self._payload(text, system_prompt, max_tokens, True, json_mode),
+                                     timeout=self.timeout, stream=True)
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                delta = chunk.get("message", {}).get("content")
+                if delta:
+                    yield delta
+                if chunk.get("done"):
+                    break
+        finally:
+            response.close()
+
+register_backend(GroqBackend.name, GroqBackend)
+register_backend(MistralBackend.name, MistralBackend)
+register_backend(OllamaBackend.name, OllamaBackend)
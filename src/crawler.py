@@ -1,47 +1,225 @@
-from urllib.parse import urljoin
+import hashlib
+import heapq
+import itertools
+import logging
 import re
-from .fetcher import fetch_page
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+import requests
+from bs4 import BeautifulSoup
+from . import http_client
+from . import metrics
+from .fetcher import fetch_page, fetch_sitemap
+from .parser import extract_sitemap_urls
+from .html_text import parse_page
 
-# Crawl site function, recusivly finds links/urls within the site with the same base URL to explorez
+logger = logging.getLogger(__name__)
 
-def crawl_site(base_url, keywords, max_depth=2):
+# Crawl budgets per site
+MAX_PAGES = 50
+CRAWL_WORKERS = 4
+MAX_SITEMAP_SEEDS = 200
+
+# Words in a link's URL or anchor text that suggest it leads to a wait time page
+RELEVANCE_TERMS = {'wait': 5, 'er': 3, 'emergency': 3, 'urgent': 2, 'ed': 1, 'care': 1, 'times': 1, 'location': 1}
+
+TRACKING_PARAMS = re.compile(r'^(?:utm_\w+|gclid|fbclid|msclkid|mc_\w+|_ga|ref)$', re.IGNORECASE)
+SKIPPED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.zip', '.doc', '.docx',
+                      '.xls', '.xlsx', '.ppt', '.pptx', '.mp4', '.mp3', '.css', '.js', '.ics')
+
+def canonicalize_url(url):
+    """
+    Normalizes a URL so variants of the same page compare equal.
+
+    Lowercases the scheme and host, drops default ports, fragments and
+    tracking parameters, sorts the query string and removes trailing slashes.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not (scheme == 'http' and parts.port == 80) and not (scheme == 'https' and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAMS.match(k)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+def site_key(url):
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+def score_link(url, anchor_text, keywords):
+    """
+    Scores how likely a link leads to a wait time page, from its URL and anchor text.
+    """
+    text = f"{urlsplit(url).path} {anchor_text}".lower()
+    words = set(re.findall(r'[a-z]+', text))
+    score = sum(weight for term, weight in RELEVANCE_TERMS.items() if term in words)
+    score += sum(10 for keyword in keywords if keyword.lower() in text)
+    return score
+
+class SeenSet:
+    """
+    Set of visited URLs stored as 8-byte hashes instead of full strings.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+
+    @staticmethod
+    def _hash(url):
+        return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def add(self, url):
+        """
+        Adds url, returning False if it was already present.
+        """
+        key = self._hash(url)
+        if key in self._hashes:
+            return False
+        self._hashes.add(key)
+        return True
+
+    def __contains__(self, url):
+        return self._hash(url) in self._hashes
+
+    def __len__(self):
+        return len(self._hashes)
+
+class Frontier:
+    """
+    Priority queue of URLs to crawl: highest score first, then shallowest.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self.seen = SeenSet()
+
+    def push(self, url, depth, score):
+        if self.seen.add(url):
+            heapq.heappush(self._heap, (-score, depth, next(self._counter), url))
+
+    def pop(self):
+        neg_score, depth, _, url = heapq.heappop(self._heap)
+        return url, depth, -neg_score
+
+    def __len__(self):
+        return len(self._heap)
+
+def fetch_robots(base_url):
+    robots = RobotFileParser()
+    robots_url = urljoin(base_url + '/', '/robots.txt')
+    try:
+        response = http_client.get(robots_url)
+        # As in RFC 9309 and urllib.robotparser: a robots.txt we may not read or a server error disallows
+        # everything, a missing one (404, 410 and other 4xx) allows everything
+        if response.status_code in (401, 403) or response.status_code >= 500:
+            robots.disallow_all = True
+        elif response.status_code >= 400:
+            robots.allow_all = True
+        else:
+            robots.parse(response.text.splitlines())
+    except requests.RequestException as e:
+        logger.warning(f"Error fetching robots.txt {robots_url}: {e}")
+        robots.allow_all = True
+    return robots
+
+def sitemap_urls(base_url, robots):
     """
-    Crawls a website starting from the given base URL and searches for URLs that contain any of the given keywords.
+    Collects page URLs from the site's sitemap and any sitemaps listed in robots.txt.
+    """
+    urls = []
+    soup = fetch_sitemap(base_url)
+    if soup:
+        urls.extend(extract_sitemap_urls(soup))
+    for sitemap_url in (robots.site_maps() or []):
+        try:
+            response = http_client.get(sitemap_url)
+            response.raise_for_status()
+            urls.extend(extract_sitemap_urls(BeautifulSoup(response.content, 'xml')))
+        except requests.RequestException as e:
+            logger.warning(f"Error fetching sitemap {sitemap_url}: {e}")
+    return urls
+
+def _fetch_parsed(url, keywords):
+    html = fetch_page(url)
+    return parse_page(html, keywords) if html else None
+
+# Crawl site function, finds pages within the site that mention the keywords, most promising links first
+
+@metrics.timed('crawl')
+def crawl_site(base_url, keywords, max_depth=2, max_pages=MAX_PAGES, workers=CRAWL_WORKERS):
+    """
+    Crawls a website starting from the given base URL and returns the pages that mention any of the given keywords.
 
     Parameters:
         base_url (str): The base URL to start crawling from.
-        keywords (list): A list of keywords to search for in the website's URLs.
-        max_depth (int, optional): The maximum depth to crawl the website. Defaults to 2.
+        keywords (list): A list of keywords to search for in the pages' text.
+        max_depth (int, optional): The maximum link depth to crawl. Defaults to 2.
+        max_pages (int, optional): The maximum number of pages to fetch. Defaults to MAX_PAGES.
+        workers (int, optional): Number of pages fetched in parallel. Defaults to CRAWL_WORKERS.
 
     Returns:
-        list: A list of URLs that contain any of the given keywords.
+        list: URLs of pages whose text contains any of the given keywords, in the order they were found.
 
-    This function uses a breadth-first search algorithm to crawl the website starting from the base URL. It keeps track of the visited URLs to avoid revisiting them. For each URL visited, it fetches the page using the `fetch_page` function and searches for any URLs that contain any of the given keywords. If a matching URL is found, it is added to the `result_urls` list. The function continues crawling the website until all URLs have been visited or the maximum depth has been reached. Finally, it returns the list of URLs that contain any of the given keywords.
-
-    Note:
-        This function assumes that the `fetch_page` function is defined in the `fetcher.py` module and returns a BeautifulSoup object representing the fetched web page.
+    The frontier is a priority queue seeded with the base URL and relevant sitemap URLs. Links are
+    canonicalized, restricted to the same site and robots.txt rules, and scored by how much their URL and
+    anchor text look like a wait time page, so the budget is spent on the most promising pages first.
     """
-    visited = set()
-    to_visit = [(base_url, 0)]
-    result_urls = []
+    site = site_key(base_url)
+    robots = fetch_robots(base_url)
+    frontier = Frontier()
+    frontier.push(canonicalize_url(base_url), 0, 0)
 
-    while to_visit:
-        print('crawling...results so far: ', str(len(result_urls)))
-        url, depth = to_visit.pop(0)
-        if depth > max_depth or url in visited:
-            continue
+    seeds = 0
+    for url in sitemap_urls(base_url, robots):
+        score = score_link(url, '', keywords)
+        if score > 0 and site_key(url) == site and seeds < MAX_SITEMAP_SEEDS:
+            frontier.push(canonicalize_url(url), 1, score)
+            seeds += 1
+
+    result_urls = []
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        while frontier or in_flight:
+            while frontier and len(in_flight) < workers and fetched < max_pages:
+                url, depth, score = frontier.pop()
+                if not robots.can_fetch(http_client.USER_AGENT, url):
+                    continue
+                in_flight[executor.submit(_fetch_parsed, url, keywords)] = (url, depth)
+                fetched += 1
+            if not in_flight:
+                break
 
-        visited.add(url)
-        soup = fetch_page(url)
-        if not soup:
-            continue
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, depth = in_flight.pop(future)
+                try:
+                    page = future.result()
+                except Exception as e:
+                    logger.error(f"Error crawling {url}: {e}")
+                    metrics.incr('errors', stage='crawl')
+                    continue
+                if not page:
+                    continue
 
-        if any(re.search(keyword, soup.text, re.IGNORECASE) for keyword in keywords):
-            result_urls.append(url)
+                if any(page.keyword_hits.values()):
+                    result_urls.append(url)
 
-        for link in soup.find_all('a', href=True):
-            full_url = urljoin(base_url, link['href'])
-            if base_url in full_url and full_url not in visited:
-                to_visit.append((full_url, depth + 1))
+                if depth >= max_depth:
+                    continue
+                for href, anchor_text in page.links:
+                    full_url = canonicalize_url(urljoin(url, href))
+                    if (not full_url.startswith(('http://', 'https://')) or site_key(full_url) != site
+                            or urlsplit(full_url).path.lower().endswith(SKIPPED_EXTENSIONS)):
+                        continue
+                    frontier.push(full_url, depth + 1, score_link(full_url, anchor_text, keywords))
 
+    metrics.incr('pages_crawled', fetched)
+    logger.info(f"Crawled {fetched} pages of {base_url} ({seeds} sitemap seeds), found {len(result_urls)} matching pages")
     return result_urls
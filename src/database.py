@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy import create_engine, make_url, event, inspect, text, func, Column, Integer, String, Text, DateTime, Float, LargeBinary, ForeignKey, Index, UniqueConstraint, insert, update, select, or_
+from sqlalchemy.orm import sessionmaker, declarative_base
+from datetime import datetime, timedelta
+import json
 import logging
-from .config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+import os
+import re
+import threading
+import time
+from . import metrics
+from . import page_codec
 
 logger = logging.getLogger(__name__)
 
@@ -16,40 +21,362 @@ class HospitalUrl(Base):
     hospital_url = Column(Text, nullable=False)
     last_fetched = Column(DateTime)
     status = Column(String(50))
+    next_fetch_at = Column(DateTime)
+    refresh_interval = Column(Integer)  # Seconds, adapted by the refresh scheduler
+    result_signature = Column(String(64))  # Hash of the last extraction, see scheduler.result_signature
+    lease_owner = Column(String(255))  # Worker currently processing this hospital, see claim_hospitals
+    lease_expires_at = Column(DateTime)
+
+class PageBody(Base):
+    # Each distinct page body stored once, compressed, optionally as a delta against the page's previous version
+    __tablename__ = 'page_bodies'
+    content_hash = Column(String(64), primary_key=True)  # sha256 of the UTF-8 body
+    encoding = Column(String(10), nullable=False)  # zstd or zlib, see page_codec
+    raw_size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    base_hash = Column(String(64))  # Body this one was compressed against, if it is a delta
+    chain_depth = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False)
 
 class WebPage(Base):
     __tablename__ = 'web_pages'
+    __table_args__ = (
+        # store_page_bodies looks up each URL's latest row as the delta base for its new body
+        Index('ix_web_pages_page_url_id', 'page_url', 'id'),
+    )
     id = Column(Integer, primary_key=True)
     hospital_id = Column(Integer, ForeignKey('hospital_urls.id'), nullable=False)
     page_url = Column(Text, nullable=False)
-    content = Column(Text)
+    content = Column(Text)  # Only set on rows written before page_bodies, see page_store
+    content_hash = Column(String(64), ForeignKey('page_bodies.content_hash'), index=True)
     relevance_score = Column(Float)
     fetched_at = Column(DateTime, nullable=False)
 
 class WaitTime(Base):
     __tablename__ = 'wait_times'
+    __table_args__ = (
+        Index('ix_wait_times_hospital_id_fetched_at', 'hospital_id', 'fetched_at'),
+        Index('ix_wait_times_fetched_at', 'fetched_at'),
+    )
     id = Column(Integer, primary_key=True)
     hospital_id = Column(Integer, ForeignKey('hospital_urls.id'), nullable=False)
+    wait_time = Column(Integer, nullable=False)  # Minutes
+    fetched_at = Column(DateTime, nullable=False)
+
+class LatestWaitTime(Base):
+    # One row per hospital, upserted alongside every wait_times insert so current waits are a primary key read
+    __tablename__ = 'latest_wait_times'
+    hospital_id = Column(Integer, ForeignKey('hospital_urls.id'), primary_key=True)
     wait_time = Column(Integer, nullable=False)
     fetched_at = Column(DateTime, nullable=False)
 
-url = f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
-engine = create_engine(url)
-Session = sessionmaker(bind=engine)
+class WaitTimeSummary(Base):
+    # Per-hospital aggregates precomputed by analytics.summarize_wait_times
+    __tablename__ = 'wait_time_summaries'
+    hospital_id = Column(Integer, ForeignKey('hospital_urls.id'), primary_key=True)
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)
+    samples = Column(Integer, nullable=False)
+    mean = Column(Float)
+    p50 = Column(Float)
+    p90 = Column(Float)
+    p95 = Column(Float)
+    min = Column(Float)
+    max = Column(Float)
+    rolling_median = Column(Float)  # Over the last ROLLING_WINDOW of the period
+    anomalies = Column(Integer, nullable=False, default=0)
+    computed_at = Column(DateTime, nullable=False)
+
+class WaitTimeSeasonality(Base):
+    # Median wait per hour of the week (0 = Monday 00:00), precomputed with WaitTimeSummary
+    __tablename__ = 'wait_time_seasonality'
+    hospital_id = Column(Integer, ForeignKey('hospital_urls.id'), primary_key=True)
+    hour_of_week = Column(Integer, primary_key=True)
+    samples = Column(Integer, nullable=False)
+    median = Column(Float, nullable=False)
+
+class DiscoveredUrl(Base):
+    # Wait time pages found by search/crawl, so later runs can fetch them directly
+    __tablename__ = 'discovered_urls'
+    __table_args__ = (
+        UniqueConstraint('hospital_id', 'page_url', name='uq_discovered_urls_hospital_id_page_url'),
+    )
+    id = Column(Integer, primary_key=True)
+    hospital_id = Column(Integer, ForeignKey('hospital_urls.id'), nullable=False, index=True)
+    page_url = Column(Text, nullable=False)
+    confidence = Column(Float, nullable=False)
+    failures = Column(Integer, nullable=False, default=0)
+    discovered_at = Column(DateTime, nullable=False)
+    last_verified = Column(DateTime)
+
+# Pool sized for the async run mode: CONCURRENCY workers plus the buffered writer
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+POOL_TIMEOUT = 30
+POOL_RECYCLE = 1800
+STATEMENT_TIMEOUT_MS = 30000
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+def database_url():
+    """
+    Returns the DSN to connect to.
+
+    DATABASE_URL takes precedence, e.g. sqlite:///data/hospitals.db for a
+    single-machine run. Otherwise the PostgreSQL settings in config are used.
+    """
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        return url
+    from .config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+    return f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the writer, busy_timeout makes writers queue instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.close()
+
+def make_engine(url, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, statement_timeout_ms=STATEMENT_TIMEOUT_MS):
+    """
+    Creates an engine with explicit pool and timeout settings for PostgreSQL or SQLite.
+    """
+    if url.startswith('sqlite'):
+        path = make_url(url).database
+        connect_args = {'check_same_thread': False, 'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if not path or path == ':memory:':
+            # In-memory databases get SQLAlchemy's SingletonThreadPool, which takes no QueuePool sizing
+            sqlite_engine = create_engine(url, connect_args=connect_args)
+        else:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            sqlite_engine = create_engine(url, pool_size=pool_size, max_overflow=max_overflow,
+                                          pool_timeout=POOL_TIMEOUT, pool_pre_ping=True, connect_args=connect_args)
+        event.listen(sqlite_engine, 'connect', _configure_sqlite)
+        return sqlite_engine
+    return create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=POOL_TIMEOUT,
+                         pool_recycle=POOL_RECYCLE, pool_pre_ping=True,
+                         connect_args={'options': f'-c statement_timeout={statement_timeout_ms}'})
+
+# The engine is created on first use, so importing this module loads no database driver or dialect
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine, _session_factory
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = make_engine(database_url())
+                _session_factory = sessionmaker(bind=engine)
+                _engine = engine
+    return _engine
+
+def Session():
+    get_engine()
+    return _session_factory()
+
+def __getattr__(name):
+    # Keeps `from .database import engine` working, it creates the engine at that point
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _dialect(conn):
+    # Dialect modules are only needed for upserts, import them with the first one
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects import postgresql
+        return postgresql
+    from sqlalchemy.dialects import sqlite
+    return sqlite
 
 def init_db():
-    Base.metadata.create_all(bind=engine, tables=[WebPage.__table__, WaitTime.__table__])
+    # hospital_urls is normally created by scripts/hospital_init.sql, create it here too for fresh (e.g. SQLite) databases
+    Base.metadata.create_all(bind=get_engine(), tables=[HospitalUrl.__table__, PageBody.__table__, WebPage.__table__,
+                                                  WaitTime.__table__, LatestWaitTime.__table__, DiscoveredUrl.__table__,
+                                                  WaitTimeSummary.__table__, WaitTimeSeasonality.__table__])
+
+    # Older tables (see scripts/hospital_init.sql) predate the scheduler, lease and page store columns
+    ensure_columns('hospital_urls', {'next_fetch_at': 'TIMESTAMP', 'refresh_interval': 'INTEGER',
+                                     'result_signature': 'VARCHAR(64)', 'lease_owner': 'VARCHAR(255)',
+                                     'lease_expires_at': 'TIMESTAMP'})
+    ensure_columns('web_pages', {'content_hash': 'VARCHAR(64)'})
+    # create_all skips tables that already exist, so indexes added since need creating separately
+    ensure_indexes('wait_times', {'ix_wait_times_hospital_id_fetched_at': ('hospital_id', 'fetched_at'),
+                                  'ix_wait_times_fetched_at': ('fetched_at',)})
+    ensure_indexes('web_pages', {'ix_web_pages_content_hash': ('content_hash',),
+                                 'ix_web_pages_page_url_id': ('page_url', 'id')})
+
+def ensure_columns(table_name, added):
+    existing = {column['name'] for column in inspect(get_engine()).get_columns(table_name)}
+    with get_engine().begin() as conn:
+        for name, column_type in added.items():
+            if name not in existing:
+                conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {name} {column_type}'))
+                logger.info(f"Added {table_name}.{name}")
+
+def ensure_indexes(table_name, indexes):
+    with get_engine().begin() as conn:
+        for name, columns in indexes.items():
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table_name} ({", ".join(columns)})'))
 
 def drop_tables():
-    Base.metadata.drop_all(bind=engine, tables=[WebPage.__table__, WaitTime.__table__])
+    Base.metadata.drop_all(bind=get_engine(), tables=[WebPage.__table__, PageBody.__table__, WaitTime.__table__,
+                                                LatestWaitTime.__table__])
+
+# The first duration in a wait time: a range, hours with optional minutes, or minutes
+WAIT_DURATION = re.compile(
+    r'(?P<low>\d+(?:\.\d+)?)\s*(?:-|–|to)\s*(?P<high>\d+(?:\.\d+)?)\s*(?P<range_unit>h(?:ours?|rs?)?|m(?:in(?:ute)?s?)?)?\b'
+    r'|(?P<hours>\d+(?:\.\d+)?)\s*h(?:ours?|rs?)?(?:\s*(?:and\s+)?(?P<hour_minutes>\d+)\s*m(?:in(?:ute)?s?)?\b|\b)'
+    r'|(?P<minutes>\d+(?:\.\d+)?)\s*(?:m(?:in(?:ute)?s?)?)?\b')
+
+def parse_wait_minutes(wait_time):
+    """
+    Converts a wait time such as 23, "23 minutes", "1 hour 15 min" or "1:15" to whole minutes.
+    A range such as "20-30 min" gives its upper bound.
+
+    Returns None if no duration can be read from it.
+    """
+    if wait_time is None or isinstance(wait_time, bool):
+        return None
+    if isinstance(wait_time, (int, float)):
+        return int(wait_time)
+    text = str(wait_time).strip().lower()
+    clock = re.fullmatch(r'(\d{1,2}):(\d{2})', text)
+    if clock:
+        return int(clock.group(1)) * 60 + int(clock.group(2))
+    match = WAIT_DURATION.search(text)
+    if match is None:
+        return None
+    if match['high']:
+        # "20-30 min" reads as the longest wait
+        minutes = float(match['high']) * (60 if (match['range_unit'] or '').startswith('h') else 1)
+    elif match['hours']:
+        minutes = float(match['hours']) * 60 + int(match['hour_minutes'] or 0)
+    else:
+        minutes = float(match['minutes'])
+    return int(round(minutes))
+
+def upsert_latest_wait_times(conn, rows):
+    """
+    Updates latest_wait_times from wait_times rows, keeping whichever reading is newer.
+    """
+    latest = {}
+    for row in rows:
+        current = latest.get(row['hospital_id'])
+        if current is None or row['fetched_at'] >= current['fetched_at']:
+            latest[row['hospital_id']] = row
+    if not latest:
+        return
+    dialect = _dialect(conn)
+    table = LatestWaitTime.__table__
+    statement = dialect.insert(table).values([
+        {'hospital_id': row['hospital_id'], 'wait_time': row['wait_time'], 'fetched_at': row['fetched_at']}
+        for row in latest.values()
+    ])
+    conn.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.hospital_id],
+        set_={'wait_time': statement.excluded.wait_time, 'fetched_at': statement.excluded.fetched_at},
+        where=statement.excluded.fetched_at >= table.c.fetched_at,
+    ))
+
+# Deltas are only taken against bodies fewer than this many deltas deep, bounding the work to read one back
+MAX_DELTA_CHAIN = 8
+
+def load_page_body(conn, content_hash, cache=None):
+    """
+    Returns the raw bytes of a stored page body, resolving delta bases.
+
+    Args:
+        conn: A SQLAlchemy connection.
+        content_hash (str): The body to load.
+        cache (dict, optional): content_hash -> raw bytes, reused across calls when reading many bodies.
+    """
+    if cache is not None and content_hash in cache:
+        return cache[content_hash]
+    table = PageBody.__table__
+    row = conn.execute(select(table.c.encoding, table.c.data, table.c.base_hash)
+                       .where(table.c.content_hash == content_hash)).one()
+    base = load_page_body(conn, row.base_hash, cache) if row.base_hash else None
+    raw = page_codec.decompress(row.encoding, row.data, base)
+    if cache is not None:
+        cache[content_hash] = raw
+    return raw
+
+def store_page_bodies(conn, web_pages):
+    """
+    Moves the content of web_pages rows into page_bodies.
 
+    Each row dict gets a content_hash and its content is cleared. Bodies that are
+    already stored are not written again. A new body is stored as a delta against
+    the latest stored version of the same URL when that is smaller.
+    """
+    new_bodies = {}
+    for row in web_pages:
+        content = row.get('content')
+        row['content'] = None
+        if content is None:
+            row['content_hash'] = None
+            continue
+        raw = content.encode('utf-8')
+        row['content_hash'] = page_codec.body_hash(raw)
+        new_bodies.setdefault(row['content_hash'], (row['page_url'], raw))
+    if not new_bodies:
+        return
+
+    bodies = PageBody.__table__
+    pages = WebPage.__table__
+    stored = set(conn.execute(select(bodies.c.content_hash)
+                              .where(bodies.c.content_hash.in_(list(new_bodies)))).scalars())
+    new_bodies = {content_hash: body for content_hash, body in new_bodies.items() if content_hash not in stored}
+    if not new_bodies:
+        metrics.incr('page_bodies_deduplicated', len(web_pages))
+        return
+
+    # The latest stored body of each URL is the delta base for its new version
+    urls = list({page_url for page_url, _ in new_bodies.values()})
+    latest_ids = (select(func.max(pages.c.id)).where(pages.c.page_url.in_(urls), pages.c.content_hash != None)
+                  .group_by(pages.c.page_url))
+    previous = {row.page_url: (row.content_hash, row.chain_depth) for row in conn.execute(
+        select(pages.c.page_url, pages.c.content_hash, bodies.c.chain_depth)
+        .join(bodies, bodies.c.content_hash == pages.c.content_hash)
+        .where(pages.c.id.in_(latest_ids)))}
+
+    now = datetime.now()
+    cache = {}
+    rows = []
+    for content_hash, (page_url, raw) in new_bodies.items():
+        encoding, data = page_codec.compress(raw)
+        base_hash, chain_depth = None, 0
+        if page_url in previous and previous[page_url][1] < MAX_DELTA_CHAIN:
+            base = load_page_body(conn, previous[page_url][0], cache)
+            delta_encoding, delta = page_codec.compress(raw, base)
+            if len(delta) < len(data):
+                encoding, data = delta_encoding, delta
+                base_hash, chain_depth = previous[page_url][0], previous[page_url][1] + 1
+        rows.append({'content_hash': content_hash, 'encoding': encoding, 'raw_size': len(raw), 'data': data,
+                     'base_hash': base_hash, 'chain_depth': chain_depth, 'created_at': now})
+    # Another writer may store the same body concurrently, the first one wins
+    dialect = _dialect(conn)
+    conn.execute(dialect.insert(bodies).values(rows).on_conflict_do_nothing(index_elements=[bodies.c.content_hash]))
+    metrics.incr('page_bodies_stored', len(rows))
+    metrics.incr('page_bodies_deduplicated', len(web_pages) - len(rows))
+    metrics.incr('page_bytes_raw', sum(row['raw_size'] for row in rows))
+    metrics.incr('page_bytes_stored', sum(len(row['data']) for row in rows))
+
+@metrics.timed('db_write', op='save_web_page')
 def save_web_page(hospital_id, page_url, content, relevance_score):
     session = Session()
     try:
+        row = {'page_url': page_url, 'content': content}
+        store_page_bodies(session.connection(), [row])
         web_page = WebPage(
             hospital_id=hospital_id,
             page_url=page_url,
-            content=content,
+            content_hash=row['content_hash'],
             relevance_score=relevance_score,
             fetched_at=datetime.now()
         )
@@ -58,10 +385,12 @@ def save_web_page(hospital_id, page_url, content, relevance_score):
         session.commit()
     except Exception as e:
         logger.error(f"Failed to save web page: {e}")
+        metrics.incr('errors', stage='db_write')
         session.rollback()
     finally:
         session.close()
 
+@metrics.timed('db_write', op='update_last_fetched')
 def update_last_fetched(hospital_id):
     session = Session()
     try:
@@ -70,6 +399,7 @@ def update_last_fetched(hospital_id):
         session.commit()
     except Exception as e:
         logger.error(f"Failed to update last fetched: {e}")
+        metrics.incr('errors', stage='db_write')
         session.rollback()
     finally:
         session.close()
@@ -85,18 +415,363 @@ def get_unprocessed_urls():
     finally:
         session.close()
 
+def get_hospitals():
+    session = Session()
+    try:
+        return session.query(HospitalUrl.id, HospitalUrl.hospital_name, HospitalUrl.hospital_url).all()
+    except Exception as e:
+        logger.error(f"Failed to fetch hospitals: {e}")
+        return []
+    finally:
+        session.close()
+
+def get_schedule():
+    session = Session()
+    try:
+        return session.query(HospitalUrl.id, HospitalUrl.hospital_url, HospitalUrl.next_fetch_at,
+                             HospitalUrl.refresh_interval, HospitalUrl.status, HospitalUrl.result_signature).all()
+    except Exception as e:
+        logger.error(f"Failed to fetch refresh schedule: {e}")
+        return []
+    finally:
+        session.close()
+
+@metrics.timed('db_write', op='update_schedule')
+def update_schedule(hospital_id, next_fetch_at, refresh_interval, status, result_signature):
+    session = Session()
+    try:
+        session.query(HospitalUrl).filter(HospitalUrl.id == hospital_id).update({
+            HospitalUrl.next_fetch_at: next_fetch_at,
+            HospitalUrl.refresh_interval: refresh_interval,
+            HospitalUrl.status: status,
+            HospitalUrl.result_signature: result_signature,
+        })
+        session.commit()
+    except Exception as e:
+        logger.error(f"Failed to update refresh schedule: {e}")
+        metrics.incr('errors', stage='db_write')
+        session.rollback()
+    finally:
+        session.close()
+
+def claim_hospitals(owner, limit, lease_seconds, now=None):
+    """
+    Leases up to limit due hospitals to owner, soonest due first.
+
+    A hospital can be claimed when it is due and has no lease or its lease has
+    expired, so hospitals held by a crashed worker are picked up again once the
+    lease runs out. On PostgreSQL the candidates are selected FOR UPDATE SKIP
+    LOCKED, so concurrent workers never block on or claim the same rows. SQLite
+    has no row locks, but it runs the single UPDATE ... RETURNING statement under
+    its database write lock, which gives the same guarantee.
+
+    Returns:
+        list: (id, hospital_url, refresh_interval, status, result_signature) rows now leased to owner.
+    """
+    now = now or datetime.now()
+    table = HospitalUrl.__table__
+    candidates = (select(table.c.id)
+                  .where(or_(table.c.next_fetch_at == None, table.c.next_fetch_at <= now),
+                         or_(table.c.lease_expires_at == None, table.c.lease_expires_at < now))
+                  .order_by(table.c.next_fetch_at.asc().nulls_first())
+                  .limit(limit)
+                  .with_for_update(skip_locked=True))
+    statement = (update(table)
+                 .where(table.c.id.in_(candidates))
+                 .values(lease_owner=owner, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                 .returning(table.c.id, table.c.hospital_url, table.c.refresh_interval, table.c.status,
+                            table.c.result_signature))
+    try:
+        with get_engine().begin() as conn:
+            return [tuple(row) for row in conn.execute(statement)]
+    except Exception as e:
+        logger.error(f"Failed to claim hospitals: {e}")
+        metrics.incr('errors', stage='db_write')
+        return []
+
+def renew_leases(owner, hospital_ids, lease_seconds):
+    """
+    Extends owner's leases on hospital_ids, the heartbeat of a live worker.
+
+    Returns:
+        int: The number of leases still held by owner.
+    """
+    if not hospital_ids:
+        return 0
+    table = HospitalUrl.__table__
+    try:
+        with get_engine().begin() as conn:
+            result = conn.execute(update(table)
+                                  .where(table.c.id.in_(list(hospital_ids)), table.c.lease_owner == owner)
+                                  .values(lease_expires_at=datetime.now() + timedelta(seconds=lease_seconds)))
+            return result.rowcount
+    except Exception as e:
+        logger.error(f"Failed to renew leases: {e}")
+        metrics.incr('errors', stage='db_write')
+        return 0
+
+@metrics.timed('db_write', op='complete_lease')
+def complete_lease(owner, hospital_id, next_fetch_at, refresh_interval, status, result_signature):
+    """
+    Records a refresh and releases the lease, only if owner still holds it.
+
+    Returns:
+        bool: False if the lease expired and was taken over by another worker.
+    """
+    table = HospitalUrl.__table__
+    try:
+        with get_engine().begin() as conn:
+            result = conn.execute(update(table)
+                                  .where(table.c.id == hospital_id, table.c.lease_owner == owner)
+                                  .values(next_fetch_at=next_fetch_at, refresh_interval=refresh_interval,
+                                          status=status, result_signature=result_signature,
+                                          lease_owner=None, lease_expires_at=None))
+            return result.rowcount == 1
+    except Exception as e:
+        logger.error(f"Failed to complete lease: {e}")
+        metrics.incr('errors', stage='db_write')
+        return False
+
+def release_leases(owner):
+    """
+    Releases every lease held by owner, e.g. after its worker process died, so they can be claimed right away.
+
+    Returns:
+        int: The number of leases released.
+    """
+    table = HospitalUrl.__table__
+    try:
+        with get_engine().begin() as conn:
+            result = conn.execute(update(table).where(table.c.lease_owner == owner)
+                                  .values(lease_owner=None, lease_expires_at=None))
+            return result.rowcount
+    except Exception as e:
+        logger.error(f"Failed to release leases: {e}")
+        metrics.incr('errors', stage='db_write')
+        return 0
+
+def get_discovered_urls(hospital_id, max_failures):
+    session = Session()
+    try:
+        rows = (session.query(DiscoveredUrl.page_url)
+                .filter(DiscoveredUrl.hospital_id == hospital_id, DiscoveredUrl.failures < max_failures)
+                .order_by(DiscoveredUrl.confidence.desc())
+                .all())
+        return [row.page_url for row in rows]
+    except Exception as e:
+        logger.error(f"Failed to fetch discovered URLs: {e}")
+        return []
+    finally:
+        session.close()
+
+@metrics.timed('db_write', op='save_discovered_urls')
+def save_discovered_urls(hospital_id, confidences):
+    """
+    Records the outcome of fetching a hospital's wait time pages.
+
+    Args:
+        hospital_id (int): The hospital the pages belong to.
+        confidences (dict): page_url -> confidence if the page yielded a wait time, or None if it didn't.
+    """
+    session = Session()
+    try:
+        now = datetime.now()
+        existing = {row.page_url: row for row in
+                    session.query(DiscoveredUrl).filter(DiscoveredUrl.hospital_id == hospital_id,
+                                                        DiscoveredUrl.page_url.in_(list(confidences)))}
+        for page_url, confidence in confidences.items():
+            row = existing.get(page_url)
+            if confidence is None:
+                if row is not None:
+                    row.failures += 1
+                continue
+            if row is None:
+                session.add(DiscoveredUrl(hospital_id=hospital_id, page_url=page_url, confidence=confidence,
+                                          failures=0, discovered_at=now, last_verified=now))
+            else:
+                row.confidence = confidence
+                row.failures = 0
+                row.last_verified = now
+        session.commit()
+    except Exception as e:
+        logger.error(f"Failed to save discovered URLs: {e}")
+        metrics.incr('errors', stage='db_write')
+        session.rollback()
+    finally:
+        session.close()
+
+@metrics.timed('db_write', op='save_wait_time')
 def save_wait_time(hospital_id, wait_time):
+    minutes = parse_wait_minutes(wait_time)
+    if minutes is None:
+        logger.warning(f"Skipping unparseable wait time for hospital {hospital_id}: {wait_time!r}")
+        return
     session = Session()
     try:
-        wait_time_record = WaitTime(
-            hospital_id=hospital_id,
-            wait_time=wait_time,
-            fetched_at=datetime.now()
-        )
-        session.add(wait_time_record)
+        row = {'hospital_id': hospital_id, 'wait_time': minutes, 'fetched_at': datetime.now()}
+        session.add(WaitTime(**row))
+        upsert_latest_wait_times(session.connection(), [row])
         session.commit()
     except Exception as e:
         logger.error(f"Failed to save wait time: {e}")
+        metrics.incr('errors', stage='db_write')
         session.rollback()
     finally:
         session.close()
+
+
+# Buffered writes: rows are collected in memory and flushed as multi-row statements
+FLUSH_ROWS = 500
+FLUSH_INTERVAL = 5.0
+
+# A failed flush puts its rows back and is retried on the next one. After MAX_FLUSH_ATTEMPTS failures in a
+# row the batch is written to SPILL_DIR instead, so e.g. a row that violates a constraint can't block all writes.
+MAX_FLUSH_ATTEMPTS = 3
+SPILL_DIR = os.path.join('cache', 'unflushed')
+
+def spill_rows(web_pages, wait_times, fetched_ids, directory=SPILL_DIR):
+    """
+    Writes rows that couldn't be flushed to a JSON file in directory and returns its path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"flush-{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'web_pages': web_pages, 'wait_times': wait_times, 'fetched_ids': sorted(fetched_ids)}, f,
+                  default=str)
+    return path
+
+class BufferedWriter:
+    """
+    Collects web page, wait time and last_fetched writes and flushes them in batches.
+
+    A flush happens when FLUSH_ROWS rows are pending or FLUSH_INTERVAL seconds
+    have passed since the last flush, and always on flush()/close(). A
+    background timer flushes rows left pending while nothing new is added.
+    Each flush is one transaction: one multi-row INSERT per table and a
+    single UPDATE for every hospital whose last_fetched changed. Rows of a
+    failed flush are kept for the next one, and spilled to SPILL_DIR if it
+    keeps failing.
+    """
+
+    def __init__(self, engine=None, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.engine = engine or get_engine()
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._web_pages = []
+        self._wait_times = []
+        self._fetched_ids = set()
+        self._last_flush = time.monotonic()
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        if flush_interval != float('inf'):
+            threading.Thread(target=self._flush_periodically, name='buffered-writer-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def add_web_page(self, hospital_id, page_url, content, relevance_score=None):
+        self._add(self._web_pages, {
+            'hospital_id': hospital_id,
+            'page_url': page_url,
+            'content': content,
+            'relevance_score': relevance_score,
+            'fetched_at': datetime.now(),
+        })
+
+    def add_wait_time(self, hospital_id, wait_time):
+        minutes = parse_wait_minutes(wait_time)
+        if minutes is None:
+            logger.warning(f"Skipping unparseable wait time for hospital {hospital_id}: {wait_time!r}")
+            return
+        self._add(self._wait_times, {
+            'hospital_id': hospital_id,
+            'wait_time': minutes,
+            'fetched_at': datetime.now(),
+        })
+
+    def mark_fetched(self, hospital_id):
+        with self._lock:
+            self._fetched_ids.add(hospital_id)
+        self._maybe_flush()
+
+    def pending(self):
+        return len(self._web_pages) + len(self._wait_times) + len(self._fetched_ids)
+
+    def _add(self, rows, row):
+        with self._lock:
+            rows.append(row)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        elapsed = time.monotonic() - self._last_flush
+        # After a failure, wait out the interval instead of retrying on every added row
+        if self._failures and elapsed < self.flush_interval:
+            return
+        if self.pending() >= self.flush_rows or elapsed >= self.flush_interval:
+            self.flush()
+
+    @metrics.timed('db_write', op='flush')
+    def flush(self):
+        with self._lock:
+            web_pages, self._web_pages = self._web_pages, []
+            wait_times, self._wait_times = self._wait_times, []
+            fetched_ids, self._fetched_ids = self._fetched_ids, set()
+            self._last_flush = time.monotonic()
+        if not (web_pages or wait_times or fetched_ids):
+            return 0
+        try:
+            with self.engine.begin() as conn:
+                if web_pages:
+                    # store_page_bodies moves content out of the rows, keep the originals for a retry
+                    page_rows = [dict(row) for row in web_pages]
+                    store_page_bodies(conn, page_rows)
+                    conn.execute(insert(WebPage.__table__).values(page_rows))
+                if wait_times:
+                    conn.execute(insert(WaitTime.__table__).values(wait_times))
+                    upsert_latest_wait_times(conn, wait_times)
+                if fetched_ids:
+                    conn.execute(update(HospitalUrl.__table__)
+                                 .where(HospitalUrl.__table__.c.id.in_(fetched_ids))
+                                 .values(last_fetched=datetime.now()))
+            metrics.incr('rows_written', len(web_pages), table='web_pages')
+            metrics.incr('rows_written', len(wait_times), table='wait_times')
+            logger.info(f"Flushed {len(web_pages)} web pages, {len(wait_times)} wait times "
+                        f"and {len(fetched_ids)} last fetched updates")
+        except Exception as e:
+            logger.error(f"Failed to flush buffered writes: {e}")
+            metrics.incr('errors', stage='db_write')
+            self._failed(web_pages, wait_times, fetched_ids)
+            return 0
+        self._failures = 0
+        return len(web_pages) + len(wait_times) + len(fetched_ids)
+
+    def _failed(self, web_pages, wait_times, fetched_ids):
+        self._failures += 1
+        if self._failures < MAX_FLUSH_ATTEMPTS:
+            with self._lock:
+                # Back in front of anything added meanwhile, so rows still go out in order
+                self._web_pages = web_pages + self._web_pages
+                self._wait_times = wait_times + self._wait_times
+                self._fetched_ids = fetched_ids | self._fetched_ids
+            return
+        self._failures = 0
+        try:
+            path = spill_rows(web_pages, wait_times, fetched_ids)
+            logger.error(f"Gave up flushing after {MAX_FLUSH_ATTEMPTS} attempts, spilled "
+                         f"{len(web_pages) + len(wait_times) + len(fetched_ids)} rows to {path}")
+            metrics.incr('rows_spilled', len(web_pages) + len(wait_times) + len(fetched_ids))
+        except OSError as e:
+            logger.error(f"Failed to spill unflushed rows, {len(web_pages) + len(wait_times)} rows lost: {e}")
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
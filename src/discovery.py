@@ -0,0 +1,35 @@
+import logging
+from .database import get_discovered_urls, save_discovered_urls
+
+logger = logging.getLogger(__name__)
+
+# Consecutive fetches without a wait time before a discovered URL is dropped
+MAX_FAILURES = 3
+# Confidence recorded when the extraction didn't report one
+DEFAULT_CONFIDENCE = 0.5
+
+def known_urls(hospital_id):
+    """
+    Returns the hospital's confirmed wait time page URLs, most confident first.
+    """
+    return get_discovered_urls(hospital_id, MAX_FAILURES)
+
+def record_pages(hospital_id, urls, pages):
+    """
+    Stores which of the fetched URLs yielded a wait time.
+
+    URLs that weren't fetched or whose extraction had no wait time count as a
+    failure for previously discovered rows and are not added as new ones.
+
+    Returns:
+        int: Number of URLs that yielded a wait time.
+    """
+    confidences = {url: None for url in urls}
+    for page in pages:
+        if page.get('wait_time_minutes') is not None:
+            confidence = page.get('confidence')
+            confidences[page['url']] = confidence if confidence is not None and confidence >= 0 else DEFAULT_CONFIDENCE
+    save_discovered_urls(hospital_id, confidences)
+    verified = sum(1 for confidence in confidences.values() if confidence is not None)
+    logger.info(f"{verified} of {len(urls)} pages yielded wait times for hospital {hospital_id}")
+    return verified
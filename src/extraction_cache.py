@@ -0,0 +1,146 @@
+import functools
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_PATH = os.path.join('cache', 'extractions.sqlite')
+EXTRACTION_CACHE_TTL = 24 * 60 * 60
+EXTRACTION_CACHE_MAX_ENTRIES = 50000
+
+# Volatile fragments that change between polls without changing the wait time
+VOLATILE_PATTERNS = [
+    re.compile(r'\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?\b'),
+    re.compile(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b'),
+    # Clock times need an am/pm marker, bare h:mm is how many sites show the wait itself
+    re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?\s*[ap]\.?m\b\.?', re.IGNORECASE),
+    re.compile(r'\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?,?(?:\s+\d{4})?\b', re.IGNORECASE),
+    re.compile(r'\b\d+\s*(?:seconds?|secs?|minutes?|mins?|hours?|hrs?)\s+ago\b', re.IGNORECASE),
+]
+
+def normalize_content(text):
+    """
+    Strips timestamps and other volatile fragments and collapses whitespace so
+    that two polls of an unchanged page produce the same cache key.
+    """
+    for pattern in VOLATILE_PATTERNS:
+        text = pattern.sub(' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def cache_key(model, template, content):
+    digest = hashlib.sha256()
+    for part in (model, template, normalize_content(content)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    Persistent memo of LLM extraction results with TTL and LRU eviction.
+    """
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH, ttl=EXTRACTION_CACHE_TTL, max_entries=EXTRACTION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._count = 0  # Rows in the table, kept up to date by get/put instead of counting on every write
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS extractions ('
+                'key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS ix_extractions_accessed_at ON extractions (accessed_at)')
+            self._count = self._conn.execute('SELECT COUNT(*) FROM extractions').fetchone()[0]
+        return self._conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT result, created_at FROM extractions WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute('DELETE FROM extractions WHERE key = ?', (key,))
+                    conn.commit()
+                    self._count -= 1
+                self.misses += 1
+                metrics.incr('cache_misses', cache='extraction')
+                return None
+            conn.execute('UPDATE extractions SET accessed_at = ? WHERE key = ?', (now, key))
+            conn.commit()
+            self.hits += 1
+            metrics.incr('cache_hits', cache='extraction')
+            return row[0]
+
+    def put(self, key, result):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            inserted = conn.execute('INSERT OR IGNORE INTO extractions (key, result, created_at, accessed_at) '
+                                    'VALUES (?, ?, ?, ?)', (key, result, now, now)).rowcount
+            if inserted:
+                self._count += 1
+            else:
+                conn.execute('UPDATE extractions SET result = ?, created_at = ?, accessed_at = ? WHERE key = ?',
+                             (result, now, now, key))
+            if self._count > self.max_entries:
+                # Other processes may share the file, count for real before evicting
+                self._count = conn.execute('SELECT COUNT(*) FROM extractions').fetchone()[0]
+                if self._count > self.max_entries:
+                    conn.execute('DELETE FROM extractions WHERE key IN (SELECT key FROM extractions ORDER BY '
+                                 'accessed_at LIMIT ?)', (self._count - self.max_entries,))
+                    self._count = self.max_entries
+            conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def memoize(self, model, template):
+        """
+        Decorator for process_with_* functions taking (text, max_tokens).
+
+        Results are keyed on the model name, the prompt template and the
+        normalized text. Failed calls (None) are not cached. model may be a
+        function returning the name, for backends only known once created.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(text, *args, **kwargs):
+                model_name = model() if callable(model) else model
+                key = cache_key(model_name, template, text)
+                try:
+                    cached = self.get(key)
+                except sqlite3.Error as e:
+                    logger.warning(f"Extraction cache read failed: {e}")
+                    cached = None
+                if cached is not None:
+                    logger.info(f"Extraction cache hit for {model_name} ({self.stats()})")
+                    return cached
+                result = func(text, *args, **kwargs)
+                if result is not None:
+                    try:
+                        self.put(key, result)
+                    except sqlite3.Error as e:
+                        logger.warning(f"Extraction cache write failed: {e}")
+                return result
+            return wrapper
+        return decorator
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from urllib.parse import urlparse
+from .parser import WAIT_TIME_KEYWORDS
+
+logger = logging.getLogger(__name__)
+
+# Pages at or above this confidence skip the LLM entirely
+CONFIDENCE_THRESHOLD = 0.8
+
+LEARNED_PATTERNS_PATH = os.path.join('cache', 'learned_patterns.json')
+
+# How far from a keyword hit a bare number still counts as its wait time
+KEYWORD_WINDOW = 150
+
+_UNIT = r'(?P<unit>minutes?|mins?|min\b|m\b|hours?|hrs?|hr\b|h\b)'
+# Only labels that say the wait is the emergency department's current one are trusted to skip the LLM
+_LABEL = r'\b(?:er|ed|emergency(?:\s+room|\s+department)?|current|estimated)\s+wait(?:ing)?(?:\s+time)?s?'
+_BARE_LABEL = r'\bwait(?:ing)?(?:\s+time)?s?'
+_SEPARATOR = r'\s*(?:is|:|-|=)?\s*'
+# H:MM as a duration, "10:30" alone reads just as well as a clock time
+_CLOCK = r'(?P<hours>1[0-2]|0?\d):(?P<minutes>[0-5]\d)\b(?!\s*[ap]\.?m)'
+# "wait of 1:15" or "wait: 1:15 hrs" say the H:MM is a duration
+_CLOCK_CUE = r'(?:\s+of\s+|' + _SEPARATOR + r'(?=\d{1,2}:\d{2}\s*(?:hrs?|hours?|h)\b))'
+
+# Ranked rules: (name, pattern, confidence). The first rule that matches wins.
+RULES = [
+    ('label_hours_minutes', re.compile(_LABEL + _SEPARATOR + r'(?P<hours>\d{1,2})\s*(?:h|hrs?|hours?)\s*(?:and\s*)?(?P<minutes>\d{1,2})\s*(?:m|mins?|minutes?)\b', re.IGNORECASE), 0.95),
+    ('label_number_unit', re.compile(_LABEL + _SEPARATOR + r'(?:about|approx\.?|approximately|~)?\s*(?P<value>\d{1,3})\s*' + _UNIT, re.IGNORECASE), 0.95),
+    ('label_clock', re.compile(_LABEL + _CLOCK_CUE + _CLOCK, re.IGNORECASE), 0.85),
+    # Without a cue the H:MM may be when the wait was posted, the LLM decides
+    ('label_clock_uncued', re.compile(_LABEL + _SEPARATOR + _CLOCK, re.IGNORECASE), 0.6),
+    # A bare "wait" may be "please wait 5 minutes", so the LLM still gets the final say
+    ('bare_label_number_unit', re.compile(_BARE_LABEL + _SEPARATOR + r'(?:about|approx\.?|approximately|~)?\s*(?P<value>\d{1,3})\s*' + _UNIT, re.IGNORECASE), 0.6),
+]
+
+# Averages and other statistics near the label aren't the live wait, such matches are capped below the threshold
+HISTORICAL = re.compile(r'\b(?:average|avg|typical|median|historical|last\s+(?:week|month|year))\b', re.IGNORECASE)
+HISTORICAL_WINDOW = 40
+HISTORICAL_CONFIDENCE = 0.5
+
+NUMBER_UNIT = re.compile(r'\b(?P<value>\d{1,3})\s*' + _UNIT, re.IGNORECASE)
+
+# All wait-time keywords folded into one alternation so the page is scanned once
+KEYWORD_SCAN = re.compile('|'.join(sorted((re.escape(k) for k in WAIT_TIME_KEYWORDS + ['wait']), key=len, reverse=True)), re.IGNORECASE)
+
+def _to_minutes(value, unit):
+    value = int(value)
+    return value * 60 if unit.lower().startswith('h') else value
+
+def _snippet(text, start, end):
+    return text[max(0, start - 30):end + 30].strip()
+
+class DomainPatterns:
+    """
+    Per-domain literal patterns learned from pages the LLM resolved.
+
+    When the LLM reports a wait time for a page, the text just before that
+    number is stored for the page's domain, so the next poll of the same
+    site can be read directly.
+    """
+
+    def __init__(self, path=LEARNED_PATTERNS_PATH):
+        self.path = path
+        self._patterns = None
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._patterns is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._patterns = json.load(f)
+            except FileNotFoundError:
+                self._patterns = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable learned patterns file {self.path}: {e}")
+                self._patterns = {}
+        return self._patterns
+
+    def get(self, domain):
+        with self._lock:
+            patterns = self._load().get(domain, [])
+            compiled = self._compiled.get(domain)
+            if compiled is None or len(compiled) != len(patterns):
+                compiled = [re.compile(p, re.IGNORECASE) for p in patterns]
+                self._compiled[domain] = compiled
+            return compiled
+
+    def learn(self, domain, text, wait_minutes):
+        # Only number + unit snippets are learned, so the unit is read back on the next poll
+        for match in NUMBER_UNIT.finditer(text):
+            if _to_minutes(match.group('value'), match.group('unit')) != wait_minutes:
+                continue
+            prefix = text[max(0, match.start() - 30):match.start()]
+            if not KEYWORD_SCAN.search(prefix) or HISTORICAL.search(prefix):
+                continue
+            # Keep the label text, but let any digits in it vary between polls
+            prefix = prefix.split('\n')[-1].lstrip()
+            pattern = re.sub(r'\\?\d+', r'\\d+', re.escape(prefix)) + r'(?P<value>\d{1,3})\s*' + _UNIT
+            with self._lock:
+                patterns = self._load().setdefault(domain, [])
+                if pattern in patterns:
+                    return
+                patterns.append(pattern)
+                self._save()
+            logger.info(f"Learned wait time pattern for {domain}: {pattern}")
+            return
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A unique temp file per write, worker processes share the patterns file
+        fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix='.learned_patterns-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._patterns, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+domain_patterns = DomainPatterns()
+
+def extract_wait_time(text, url=None):
+    """
+    Deterministically extracts a wait time from page text.
+
+    Args:
+        text (str): Page content (markdown or plain text).
+        url (str, optional): Page URL, used to look up learned per-domain patterns.
+
+    Returns:
+        dict or None: {'wait_time_minutes', 'confidence', 'rule', 'snippet'} for the
+        best-ranked match, or None if the page has no wait-time keyword at all.
+    """
+    hits = [m.start() for m in KEYWORD_SCAN.finditer(text)]
+    if not hits:
+        return None
+
+    if url:
+        for pattern in domain_patterns.get(urlparse(url).netloc.lower()):
+            # Patterns learned before units were captured can't tell hours from minutes
+            if 'unit' not in pattern.groupindex:
+                continue
+            match = pattern.search(text)
+            if match:
+                return {'wait_time_minutes': _to_minutes(match.group('value'), match.group('unit')),
+                        'confidence': 0.9, 'rule': 'learned',
+                        'snippet': _snippet(text, match.start(), match.end())}
+
+    for name, pattern, confidence in RULES:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if 'value' in pattern.groupindex:
+            minutes = _to_minutes(match.group('value'), match.group('unit'))
+        else:
+            minutes = int(match.group('hours')) * 60 + int(match.group('minutes'))
+        if HISTORICAL.search(text, max(0, match.start() - HISTORICAL_WINDOW), match.end()):
+            confidence = min(confidence, HISTORICAL_CONFIDENCE)
+        return {'wait_time_minutes': minutes, 'confidence': confidence,
+                'rule': name, 'snippet': _snippet(text, match.start(), match.end())}
+
+    # Fall back to the closest number+unit around a keyword hit, scored by distance
+    best = None
+    for match in NUMBER_UNIT.finditer(text):
+        distance = min(abs(match.start() - hit) for hit in hits)
+        if distance <= KEYWORD_WINDOW and (best is None or distance < best[0]):
+            best = (distance, match)
+    if best:
+        distance, match = best
+        return {'wait_time_minutes': _to_minutes(match.group('value'), match.group('unit')),
+                'confidence': round(0.7 - 0.3 * distance / KEYWORD_WINDOW, 2),
+                'rule': 'keyword_proximity', 'snippet': _snippet(text, match.start(), match.end())}
+    return None
+
+def format_result(result):
+    """
+    Renders a fast-path result in the same shape as the LLM output.
+    """
+    return f"- Estimated wait time: {result['wait_time_minutes']} minutes\n- Confidence level: {result['confidence']}"
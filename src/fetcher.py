@@ -1,31 +1,44 @@
+import json
 import logging
+import os
 import requests
+from urllib.parse import urlparse
 from bs4 import BeautifulSoup
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from huggingface_hub import login
-from .config import huggingface_token, groq_token
-import torch
-from groq import Groq
+from . import http_client
+from .page_cache import PageCache
+from .extraction_cache import extraction_cache
+from . import fast_extractor
+from . import metrics
+from .pruner import build_prompt, prune_content, fit_to_budget, count_tokens, INPUT_TOKEN_BUDGET, OUTPUT_TOKEN_LIMIT
+from .html_text import parse_page
+from .parser import WAIT_TIME_KEYWORDS
+from .backends import get_backend
+from .structured_output import WAIT_TIME_SCHEMA, read_json_object, parse_wait_time_json
+from .llm_batcher import LLMBatcher
+from . import llm_router
+
+# Model clients (Groq, Ollama, the local Mistral model) are created by get_backend() on first use,
+# so importing this module needs no network access, credentials or torch.
 
-import ollama
-
-#model = ollama.load_model("llama-3.7b")
+logger = logging.getLogger(__name__)
 
-client = Groq(api_key=groq_token)
+ENCODINGS = ['utf-8', 'iso-8859-1', 'windows-1252']
 
-login(token=huggingface_token)
+# Reader service that turns pages into markdown, the URL to read is appended
+JINA_READER = 'https://r.jina.ai/'
 
-logger = logging.getLogger(__name__)
+page_cache = PageCache()
 
-device = torch.device('mps')
+# Shares LLM requests between hospitals once enable_batching() is called, see extract_batched
+llm_batcher = None
 
-USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-TIMEOUT = 10
-ENCODINGS = ['utf-8', 'iso-8859-1', 'windows-1252']
+# Backend extractions go to. The router spreads them over Groq and local models (llm_router.PROVIDERS)
+# by their rate limits and health, set LLM_BACKEND=groq to talk to Groq alone.
+LLM_BACKEND = os.environ.get('LLM_BACKEND', llm_router.Router.name)
 
-# Initialize the Mistral-7B tokenizer and model
-#mistral_tokenizer = AutoTokenizer.from_pretrained("mistralai/Mistral-7B-Instruct-v0.3")
-#mistral_model = AutoModelForCausalLM.from_pretrained("mistralai/Mistral-7B-Instruct-v0.3").to(device)
+def llm_model():
+    # Cached extractions are keyed on what actually answers them, e.g. the router's 'groq+ollama'
+    return get_backend(LLM_BACKEND).model
 
 prompt = """
 **Objective:** Find the wait time for a hospital from the provided content.
@@ -81,33 +94,24 @@ Given a sample markdown content from a hospital webpage, extract and interpret t
 """
 
 
-system_prompt = """
+structured_system_prompt = f"""
 **Output:**
-- Estimated wait time: [wait time value]
-- Confidence level: [confidence score]
+Respond with a single JSON object and nothing else, matching this JSON schema:
+{json.dumps(WAIT_TIME_SCHEMA)}
 
 **Instructions:**
-1. **Markdown Content:** Analyze the provided markdown content to identify relevant information related to the wait time.
-2. **Analysis:** The system will parse the markdown content to find specific mentions of wait time information.
-3. **Output:** Provide the estimated wait time for the hospital along with a confidence score indicating the reliability of the prediction. If no wait time is found, output "None" for the wait time with a confidence score of -1.
-
-**Additional Information:**
-- The wait time may be mentioned in various formats within the markdown content, such as text, lists, tables, or embedded information.
-- Consider contextual clues such as headings, labels, or surrounding text to accurately interpret the wait time information.
-- If the wait time is not explicitly stated, use natural language processing techniques to infer it based on related information, such as appointment schedules, emergency room statistics, or patient reviews.
-- The confidence score indicates the level of certainty associated with the estimated wait time. Higher confidence scores denote more reliable predictions, while lower scores may indicate ambiguity or insufficient information.
-- Continuous evaluation and refinement of the system are necessary to improve accuracy and adaptability across different hospital websites and variations in content structure.
+1. **Markdown Content:** Analyze the provided markdown content to identify the live wait time posted on the page.
+2. **wait_time_minutes:** The current wait time converted to whole minutes, e.g. "1 hr 15 min" is 75. Use null if the page has no live wait time.
+3. **confidence:** How reliable the value is, from 0 to 1. Use 0 when wait_time_minutes is null.
+4. **source_snippet:** The exact text from the page the wait time was read from, or null.
 - Dont forget, Remember I dont want averages or historical but live data which is posted on their website.
-
-
 """
 
 
 def fetch_sitemap(url):
-    headers = {'User-Agent': USER_AGENT}
     sitemap_url = f"{url}/sitemap.xml"
     try:
-        response = requests.get('https://r.jina.ai/' + sitemap_url, headers=headers, timeout=TIMEOUT)
+        response = http_client.get(JINA_READER + sitemap_url)
         response.raise_for_status()
         return BeautifulSoup(response.content, 'xml')
     except requests.RequestException as e:
@@ -117,16 +121,14 @@ def fetch_sitemap(url):
 import re
 
 def fetch_page(url):
-    headers = {'User-Agent': USER_AGENT}
     try:
-        response = requests.get(url, headers=headers, timeout=TIMEOUT)
+        response = http_client.get(url)
         response.raise_for_status()
         cleaned_content = clean_html_content(response.text)
         
         # Check if the cleaned content is a string
         if isinstance(cleaned_content, str):
             return cleaned_content
-        print(cleaned_content.type)
         soup = BeautifulSoup(cleaned_content, 'html.parser')
         return parse_content_with_encodings(soup.get_text())
         
@@ -139,83 +141,143 @@ def clean_html_content(html_content):
     cleaned_content = re.sub(r'\s+', ' ', html_content)
     return cleaned_content
 
+@metrics.timed('fetch')
 def fetch_page_jina(url):
-    headers = {'User-Agent': USER_AGENT}
+    cached = page_cache.get(url)
     try:
-        response = requests.get('https://r.jina.ai/' + url, headers=headers, timeout=TIMEOUT)
+        response = http_client.get(JINA_READER + url, headers=page_cache.conditional_headers(cached))
+        if response.status_code == 304 and cached:
+            logger.info(f"Page not modified since last fetch: {url}")
+            metrics.incr('cache_hits', cache='page')
+            return cached['content']
         response.raise_for_status()
-        cleaned_content = response
-        
-        # Check if the cleaned content is a string
-        return cleaned_content
-        #print(cleaned_content.type)
-        soup = BeautifulSoup(cleaned_content, 'html.parser')
-        return parse_content_with_encodings(soup.get_text())
-        
+        content = response.text
+        page_cache.put(url, content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return content
     except requests.RequestException as e:
         logger.error(f"Error fetching page {url}: {e}")
+        metrics.incr('errors', stage='fetch')
         return None
 
+def enable_batching(batcher=None):
+    """
+    Packs LLM extractions from concurrently processed hospitals into shared requests.
+
+    Only worth it when many hospitals are in flight (the async, daemon and worker
+    modes); a lone page would wait for company and then be sent on its own anyway.
+    """
+    global llm_batcher
+    llm_batcher = batcher or LLMBatcher(backend=LLM_BACKEND)
+
+def process_page(url, formatted_prompt, content, max_tokens, keywords=None, hospital_id=None):
+    """
+    Extracts the wait time from one page.
+
+    Returns:
+        dict or None: wait_time_minutes (int or None), confidence, source_snippet and the raw
+        extraction output, or None if the extraction failed or didn't match the schema.
+    """
+    # Clearly labelled wait times are read directly, the LLM only sees ambiguous pages
+    fast_result = fast_extractor.extract_wait_time(content, url)
+    if fast_result and fast_result['confidence'] >= fast_extractor.CONFIDENCE_THRESHOLD:
+        logger.info(f"Fast-path extracted wait time for {url}: {fast_result}")
+        metrics.incr('cache_hits', cache='fast_path')
+        return {'wait_time_minutes': fast_result['wait_time_minutes'], 'confidence': fast_result['confidence'],
+                'source_snippet': fast_result['snippet'], 'output': fast_extractor.format_result(fast_result)}
+
+    # Skip the LLM when the page content is identical to what we extracted last time
+    cached_output = page_cache.get_extraction(url, content)
+    result = parse_wait_time_json(cached_output) if cached_output is not None else None
+    if result is not None:
+        logger.info(f"Reusing cached extraction for unchanged page {url}")
+        metrics.incr('cache_hits', cache='page_extraction')
+        output = cached_output
+    else:
+        if llm_batcher is not None:
+            page_text = fit_to_budget(prune_content(content, keywords), INPUT_TOKEN_BUDGET)
+            output = extract_batched(formatted_prompt, max_tokens, hospital_id, url, page_text)
+        else:
+            output = extract_with_groq(formatted_prompt, max_tokens=max_tokens)
+        if output is None:
+            return None
+        result = parse_wait_time_json(output)
+        if result is None:
+            logger.warning(f"Discarding extraction for {url} that doesn't match the schema: {output[:200]}")
+            metrics.incr('errors', stage='validate')
+            return None
+        page_cache.set_extraction(url, content, output)
+        if result['wait_time_minutes'] is not None:
+            fast_extractor.domain_patterns.learn(urlparse(url).netloc.lower(), content, result['wait_time_minutes'])
+    result['output'] = output
+    return result
+
+def page_record(hospital_id, url, content, result):
+    return {
+        'hospital_id': hospital_id,
+        'url': url,
+        'content': content,
+        'content_mistral': result['output'] if result else None,
+        'wait_time_minutes': result['wait_time_minutes'] if result else None,
+        'confidence': result['confidence'] if result else None,
+    }
+
 def parse_content_with_encodings(response):
     for encoding in ENCODINGS:
         try:
-            response.encoding = encoding
-            content = response.text
-            return BeautifulSoup(content, 'html.parser')
+            response.content.decode(encoding)
+            return parse_page(response.content, WAIT_TIME_KEYWORDS, encoding=encoding)
         except Exception as e:
             logger.warning(f"Error parsing content with encoding {encoding}: {e}")
     logger.error("Failed to parse content with all tried encodings.")
     return None
 
-def process_with_mistral(text, max_tokens):
-    logger.info(f"Processing text with Mistral model: {text[:200]}...")  # Log a snippet of the text
-    try:
-        print("zero!")
-        inputs = mistral_tokenizer(text, return_tensors="pt").to(device)
-        print("uno!")
-        outputs = mistral_model.generate(inputs).to(device)
-        print("dos!")
-        decoded_output = mistral_tokenizer.decode(outputs[0], skip_special_tokens=True).to(device)
-        print("tres!")
-        logger.info(f"Processed output: {decoded_output[:200]}...")  # Log a snippet of the output
-        return decoded_output
-    except Exception as e:
-        logger.error(f"Error processing with Mistral: {e}")
-        return None
-
-def process_with_groq(text, max_tokens):
+def record_tokens(backend, text, output, system):
+    # Token counting costs a tokenizer pass, so it only runs while metrics are collected
+    if metrics.enabled():
+        metrics.incr('llm_tokens_sent', count_tokens(system) + count_tokens(text), backend=backend)
+        metrics.incr('llm_tokens_received', count_tokens(output or ''), backend=backend)
+
+@extraction_cache.memoize(model=llm_model, template=structured_system_prompt)
+@metrics.timed('llm', backend=LLM_BACKEND)
+def extract_with_groq(text, max_tokens):
+    """
+    Streams a JSON-mode completion and stops reading as soon as the JSON object is complete.
+
+    Returns:
+        str or None: The JSON object text, or None if the model failed or never closed the object.
+    """
     try:
-        completion = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[
-                {
-                    "role": "user",
-                    "content": text
-                },
-                {
-                    "role": "system",
-                    "content": system_prompt
-                }
-            ],
-            temperature=0,
-            max_tokens=8192,
-            top_p=1,
-            stream=False,
-            stop=None,
-        )
-
-        return completion.choices[0].message.content
-
-        processed_output = ""
-        for chunk in completion:
-            processed_output += chunk.choices[0].delta.content or ""
-
-        return processed_output
+        chunks = get_backend(LLM_BACKEND).stream(text, structured_system_prompt, max_tokens, json_mode=True)
+        output, stopped_early = read_json_object(chunks)
+        if stopped_early:
+            metrics.incr('llm_streams_stopped_early', backend=LLM_BACKEND)
+        if output is None:
+            logger.warning(f"{LLM_BACKEND} stream ended without a complete JSON object")
+            metrics.incr('errors', stage='llm', backend=LLM_BACKEND)
+            return None
+        record_tokens(LLM_BACKEND, text, output, system=structured_system_prompt)
+        return output
     except Exception as e:
-        logger.error(f"Error processing with Groq: {e}")
+        logger.error(f"Error processing with {LLM_BACKEND}: {e}")
+        metrics.incr('errors', stage='llm', backend=LLM_BACKEND)
         return None
 
-def fetch_and_process_pages(hospital_id, base_urls, keywords, max_tokens=8192):
+@extraction_cache.memoize(model=llm_model, template=structured_system_prompt)
+def extract_batched(text, max_tokens, hospital_id, url, page_text):
+    """
+    Extracts through llm_batcher, falling back to a single-page request when the batch
+    didn't produce a valid result for this page.
+
+    Cached under the same key as extract_with_groq, since both return one page's JSON object.
+    """
+    output = llm_batcher.submit(hospital_id, url, page_text).result()
+    if output is not None:
+        return output
+    metrics.incr('llm_batch_fallbacks')
+    # Skip extract_with_groq's cache layer, this call's own wrapper already missed
+    return extract_with_groq.__wrapped__(text, max_tokens)
+
+def fetch_and_process_pages(hospital_id, base_urls, keywords, max_tokens=OUTPUT_TOKEN_LIMIT):
     pages = []
     logger.info(f"Fetching and processing pages for hospital {hospital_id} from {base_urls}")
     
@@ -235,20 +297,18 @@ def fetch_and_process_pages(hospital_id, base_urls, keywords, max_tokens=8192):
                 page_content = fetch_page_jina(url)
                 if page_content:
                     content = page_content
-                    formatted_prompt = prompt.format(html_content=content, keywords=keywords)
-                    #processed_content_mistral = process_with_mistral(formatted_prompt, max_tokens=max_tokens)
-                    processed_content_mistral = process_with_groq(formatted_prompt, max_tokens=max_tokens)
-                    pages.append({'hospital_id': hospital_id, 'url': url, 'content_mistral': processed_content_mistral})
+                    formatted_prompt = build_prompt(prompt, content, keywords)
+                    result = process_page(url, formatted_prompt, content, max_tokens, keywords, hospital_id)
+                    pages.append(page_record(hospital_id, url, content, result))
         else:
             # If sitemap not found, fetch pages directly from the base URL
             page_content = fetch_page_jina(base_url)
             if page_content:
                 content = page_content
                 #formatted_prompt = prompt.format(html_content=content, keywords=keywords)
-                formatted_prompt = user_prompt.format(markdown_content=content)
+                formatted_prompt = build_prompt(user_prompt, content, keywords)
                 logger.info(f"Fetched content: {formatted_prompt[:200]}...")  # Log a snippet of the content
-                #processed_content_mistral = process_with_mistral(formatted_prompt, max_tokens=max_tokens)
-                processed_content_mistral = process_with_groq(formatted_prompt, max_tokens=max_tokens)
-                logger.info(f"Processed content for {base_url}: {processed_content_mistral}")  # Log a snippet of the output
-                pages.append({'hospital_id': hospital_id, 'url': base_url, 'content_mistral': processed_content_mistral})
+                result = process_page(base_url, formatted_prompt, content, max_tokens, keywords, hospital_id)
+                logger.info(f"Processed content for {base_url}: {result}")  # Log a snippet of the output
+                pages.append(page_record(hospital_id, base_url, content, result))
     return pages
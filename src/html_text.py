@@ -0,0 +1,100 @@
+import io
+import logging
+import re
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+BLOCK_TAGS = {
+    'p', 'div', 'li', 'td', 'th', 'tr', 'dt', 'dd', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'section', 'article', 'header', 'footer', 'aside', 'main', 'nav', 'blockquote', 'pre',
+    'table', 'ul', 'ol', 'dl', 'form', 'label', 'button', 'caption', 'figcaption', 'body',
+}
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+
+WHITESPACE = re.compile(r'\s+')
+
+class ParsedPage:
+    """
+    The result of parsing a page once: text blocks, links and keyword hits.
+
+    Attributes:
+        blocks (list of str): Whitespace-normalized text of each block-level element, in the order the elements close.
+        links (list of tuple): (href, anchor text) for every <a href>.
+        keyword_hits (dict): keyword -> indexes into blocks that contain it (case-insensitive).
+    """
+
+    def __init__(self, blocks, links, keywords):
+        self.blocks = blocks
+        self.links = links
+        self.keyword_hits = {keyword: [] for keyword in keywords}
+        if keywords:
+            lowered = {keyword.lower(): keyword for keyword in keywords}
+            pattern = re.compile('|'.join(re.escape(k) for k in sorted(lowered, key=len, reverse=True)), re.IGNORECASE)
+            for i, block in enumerate(blocks):
+                if not pattern.search(block):
+                    continue
+                # The alternation only tells us some keyword is present, check each one on the matching blocks
+                lower_block = block.lower()
+                for lower_keyword, keyword in lowered.items():
+                    if lower_keyword in lower_block:
+                        self.keyword_hits[keyword].append(i)
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = '\n'.join(self.blocks)
+        return self._text
+
+def _tag(element):
+    tag = element.tag
+    if not isinstance(tag, str):
+        return None  # Comments and processing instructions
+    return tag.rsplit('}', 1)[-1].lower()
+
+def parse_page(html, keywords=(), encoding=None):
+    """
+    Parses HTML once with lxml in streaming mode.
+
+    Each element is discarded as soon as its block has been read, so memory
+    stays flat on large pages.
+
+    Args:
+        html (str or bytes): The page. Bytes let lxml honour the page's declared charset.
+        keywords (list): Keywords to index in keyword_hits.
+        encoding (str, optional): Encoding to decode bytes with, overriding the page's declaration.
+
+    Returns:
+        ParsedPage: The page's text blocks, links and keyword hits.
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+        encoding = 'utf-8'
+    blocks = []
+    links = []
+    skipping = 0
+    events = etree.iterparse(io.BytesIO(html), events=('start', 'end'), html=True, encoding=encoding,
+                             recover=True, huge_tree=True)
+    for event, element in events:
+        tag = _tag(element)
+        if event == 'start':
+            if tag in SKIPPED_TAGS:
+                skipping += 1
+            continue
+
+        if tag in SKIPPED_TAGS:
+            skipping -= 1
+            element.clear(keep_tail=True)
+            continue
+        if skipping:
+            continue
+        if tag == 'a' and element.get('href'):
+            links.append((element.get('href'), WHITESPACE.sub(' ', ''.join(element.itertext())).strip()))
+        if tag in BLOCK_TAGS or tag == 'html':
+            # Nested blocks were already read and cleared, so this only picks up the element's own text
+            text = WHITESPACE.sub(' ', ''.join(element.itertext())).strip()
+            if text:
+                blocks.append(text)
+            element.clear(keep_tail=True)
+    return ParsedPage(blocks, links, keywords)
@@ -0,0 +1,99 @@
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# (connect, read) timeouts shared by every outgoing request
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Number of distinct hosts to keep pools for, and keep-alive connections per host
+POOL_CONNECTIONS = 100
+POOL_MAXSIZE = 20
+
+# Retries with exponential backoff plus random jitter so parallel workers don't retry in lockstep
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+_session = None
+_session_lock = threading.Lock()
+
+def build_retry(retries=RETRIES):
+    return Retry(
+        total=retries,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_jitter=BACKOFF_JITTER,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=['GET', 'HEAD'],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+def build_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, retries=RETRIES):
+    """
+    Builds a requests session with keep-alive pooling and jittered retries.
+
+    Args:
+        pool_connections (int): Number of per-host connection pools to cache.
+        pool_maxsize (int): Maximum number of kept-alive connections per host.
+        retries (int): Number of retries for connection errors and retryable statuses.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=build_retry(retries), pool_block=False)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'User-Agent': USER_AGENT})
+    return session
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+def mount(adapter):
+    """
+    Routes all http(s) traffic of the shared session through adapter, e.g. for record/replay.
+    """
+    session = get_session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+def get(url, headers=None, timeout=TIMEOUT, **kwargs):
+    """
+    GETs a URL through the shared pooled session.
+
+    Raises the same requests exceptions as requests.get, so callers keep their
+    existing error handling.
+    """
+    try:
+        response = get_session().get(url, headers=headers, timeout=timeout, **kwargs)
+    except requests.RequestException:
+        metrics.incr('http_errors')
+        raise
+    metrics.incr('http_requests', status=response.status_code)
+    if metrics.enabled() and not kwargs.get('stream'):
+        metrics.incr('bytes_fetched', len(response.content))
+    return response
+
+def close():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,178 @@
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from . import metrics
+from .backends import get_backend
+from .llm_router import PROVIDER_LIMITS
+from .pruner import count_tokens
+from .structured_output import WAIT_TIME_SCHEMA, read_json_object, validate_wait_time
+
+logger = logging.getLogger(__name__)
+
+# Prompt tokens per batched request, leaving room in llama3-8b-8192's context for the output
+BATCH_TOKEN_BUDGET = 6000
+BATCH_MAX_ITEMS = 8
+# Seconds to wait for more pages before sending a partial batch
+BATCH_WAIT = 0.3
+# Completion tokens allowed per page in the batch
+OUTPUT_TOKENS_PER_ITEM = 96
+# Batches in flight at once, for providers without a concurrency limit (e.g. Groq, which the router rate limits)
+MAX_CONCURRENT_BATCHES = 4
+
+batch_system_prompt = f"""
+**Output:**
+Respond with a single JSON object and nothing else. It has one key for every page id in the input,
+each mapping to an object matching this JSON schema:
+{json.dumps(WAIT_TIME_SCHEMA)}
+
+**Instructions:**
+1. **Pages:** Each page is the markdown content of one hospital web page, under a "### Page <id>" heading. Treat every page on its own.
+2. **wait_time_minutes:** The current wait time posted on that page, converted to whole minutes. Use null if the page has no live wait time.
+3. **confidence:** How reliable the value is, from 0 to 1. Use 0 when wait_time_minutes is null.
+4. **source_snippet:** The exact text from that page the wait time was read from, or null.
+- Dont forget, Remember I dont want averages or historical but live data which is posted on their website.
+"""
+
+batch_user_prompt = """
+**Objective:** Extract the live wait time from each of the hospital pages below.
+
+{pages}
+"""
+
+def batch_concurrency(backend):
+    """
+    Returns how many batches backend can work on at once: the sum of its providers' concurrency
+    for the router, else the backend's own limit, capped at MAX_CONCURRENT_BATCHES.
+    """
+    names = [provider.name for provider in getattr(backend, 'providers', [])] or [backend.name]
+    limits = [PROVIDER_LIMITS.get(name, {}).get('concurrency') or MAX_CONCURRENT_BATCHES for name in names]
+    return min(sum(limits), MAX_CONCURRENT_BATCHES)
+
+def format_page(page_id, hospital_id, url, content):
+    return f"### Page {page_id} (hospital {hospital_id}, {url})\n{content}\n"
+
+class LLMBatcher:
+    """
+    Packs pages from many hospitals into shared LLM requests.
+
+    submit() returns a Future. A background thread drains the queue, waiting
+    up to batch_wait seconds to fill a batch of at most max_items pages within
+    token_budget prompt tokens, and sends it as one JSON-mode request asking
+    for one result per page id. Batches are sent from a small thread pool,
+    as many at once as the backend's providers can serve (batch_concurrency),
+    and pages keep queueing into the next batch while all of them are busy. Each future resolves to that page's result as
+    a JSON object string, or to None when the batch response was malformed or
+    left the page out, in which case the caller retries the page on its own.
+    """
+
+    def __init__(self, backend='groq', token_budget=BATCH_TOKEN_BUDGET, max_items=BATCH_MAX_ITEMS,
+                 batch_wait=BATCH_WAIT):
+        self.backend = backend
+        self.token_budget = token_budget
+        self.max_items = max_items
+        self.batch_wait = batch_wait
+        self._overhead = count_tokens(batch_system_prompt) + count_tokens(batch_user_prompt)
+        self._queue = queue.Queue()
+        self._carry = None
+        self._thread = None
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def submit(self, hospital_id, url, content):
+        future = Future()
+        self._queue.put({'hospital_id': hospital_id, 'url': url, 'content': content,
+                         'tokens': count_tokens(content), 'future': future})
+        self._ensure_worker()
+        return future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._executor is None:
+                concurrency = batch_concurrency(get_backend(self.backend))
+                self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='llm-batch')
+                self._slots = threading.Semaphore(concurrency)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='llm-batcher', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        # A page that didn't fit the previous batch starts the next one
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        batch = [first]
+        tokens = self._overhead + first['tokens']
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_items:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if tokens + item['tokens'] > self.token_budget:
+                self._carry = item
+                break
+            batch.append(item)
+            tokens += item['tokens']
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free slot before collecting, so pages arriving meanwhile fill the next batch
+            self._slots.acquire()
+            batch = self._next_batch()
+            if len(batch) == 1:
+                # Nothing to share the request with, the caller's single-page path is cheaper
+                self._slots.release()
+                batch[0]['future'].set_result(None)
+                continue
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            self._resolve(batch)
+        finally:
+            self._slots.release()
+
+    def _resolve(self, batch):
+        try:
+            results = self._complete(batch)
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(batch)} pages: {e}")
+            metrics.incr('errors', stage='llm', backend=f'{self.backend}_batch')
+            results = {}
+        missing = 0
+        for page_id, item in enumerate(batch, 1):
+            result = validate_wait_time(results.get(str(page_id)))
+            if result is None:
+                missing += 1
+            item['future'].set_result(json.dumps(result) if result is not None else None)
+        metrics.incr('llm_batches', backend=self.backend)
+        metrics.incr('llm_batch_pages', len(batch), backend=self.backend)
+        if missing:
+            logger.warning(f"Batch response had no valid result for {missing} of {len(batch)} pages, "
+                           f"retrying them one by one")
+
+    def _complete(self, batch):
+        pages = ''.join(format_page(page_id, item['hospital_id'], item['url'], item['content'])
+                        for page_id, item in enumerate(batch, 1))
+        text = batch_user_prompt.format(pages=pages)
+        with metrics.span('llm', backend=f'{self.backend}_batch'):
+            chunks = get_backend(self.backend).stream(text, batch_system_prompt,
+                                                      OUTPUT_TOKENS_PER_ITEM * len(batch), json_mode=True)
+            output, _ = read_json_object(chunks)
+        if metrics.enabled():
+            metrics.incr('llm_tokens_sent', self._overhead + sum(item['tokens'] for item in batch),
+                         backend=self.backend)
+            metrics.incr('llm_tokens_received', count_tokens(output or ''), backend=self.backend)
+        if output is None:
+            raise ValueError("response ended without a complete JSON object")
+        results = json.loads(output)
+        if not isinstance(results, dict):
+            raise ValueError(f"expected a JSON object keyed by page id, got {type(results).__name__}")
+        return results
@@ -0,0 +1,385 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from . import metrics
+from .backends import Backend, get_backend, register_backend
+from .pruner import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Providers tried in this order, override with e.g. LLM_PROVIDERS=ollama,groq,mistral
+PROVIDERS = os.environ.get('LLM_PROVIDERS', 'groq,ollama')
+
+# Requests per minute, tokens per minute and requests in flight each provider allows, None for no limit.
+# Groq's free tier for llama3-8b-8192 allows 30 requests and 30k tokens a minute; the local models
+# are limited by how many generations they can run at once.
+PROVIDER_LIMITS = {
+    'groq': {'rpm': 30, 'tpm': 30000, 'concurrency': None},
+    'ollama': {'rpm': None, 'tpm': None, 'concurrency': 2},
+    'mistral': {'rpm': None, 'tpm': None, 'concurrency': 8},
+}
+
+# A request still unanswered after its provider's HEDGE_PERCENTILE latency (at least HEDGE_MIN_DELAY,
+# HEDGE_DELAY until LATENCY_SAMPLES / 5 latencies are known) is also sent to the next available provider
+HEDGE_DELAY = 3.0
+HEDGE_MIN_DELAY = 0.5
+HEDGE_PERCENTILE = 95
+LATENCY_SAMPLES = 50
+
+# A throttled provider rests for its Retry-After, or RATE_LIMIT_COOLDOWN seconds without one.
+# A failing provider rests FAILURE_COOLDOWN seconds, doubling with every failure in a row up to MAX_COOLDOWN.
+RATE_LIMIT_COOLDOWN = 10
+FAILURE_COOLDOWN = 5
+MAX_COOLDOWN = 300
+
+# How long a request waits for a provider to have capacity, and how many providers it tries, before failing
+MAX_QUEUE_WAIT = 60
+MAX_ATTEMPTS = 4
+
+ROUTER_THREADS = 32
+
+# Notified whenever a provider finishes a request, so requests waiting for a busy provider wake up right away
+_released = threading.Condition()
+
+class TokenBucket:
+    """
+    Allows up to rate_per_minute units a minute, in bursts of at most one minute's worth.
+
+    Not thread safe, Provider serializes access.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """
+        Seconds until amount units are available. Requests bigger than the bucket wait for a full one.
+        """
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+    def empty(self, now):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+class Provider:
+    """
+    One backend behind the router, with its rate limits, health and recent latencies.
+    """
+
+    def __init__(self, name, rpm=None, tpm=None, concurrency=None):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.failures = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def wait_time(self, tokens, now):
+        """
+        Seconds until this provider could take a request of tokens tokens, or None if only
+        a finishing request can free it up.
+        """
+        with self._lock:
+            if self.concurrency is not None and self.in_flight >= self.concurrency:
+                return None
+            waits = [self.cooldown_until - now]
+            if self.requests is not None:
+                waits.append(self.requests.wait_time(1, now))
+            if self.tokens is not None:
+                waits.append(self.tokens.wait_time(tokens, now))
+            return max(0.0, *waits)
+
+    def try_acquire(self, tokens):
+        now = time.monotonic()
+        with self._lock:
+            if self.concurrency is not None and self.in_flight >= self.concurrency:
+                return False
+            if now < self.cooldown_until:
+                return False
+            if self.requests is not None and self.requests.wait_time(1, now) > 0:
+                return False
+            if self.tokens is not None and self.tokens.wait_time(tokens, now) > 0:
+                return False
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            return True
+
+    def release(self, unused_tokens=0):
+        with self._lock:
+            self.in_flight -= 1
+            if self.tokens is not None and unused_tokens > 0:
+                self.tokens.refund(unused_tokens)
+        with _released:
+            _released.notify_all()
+
+    def hedge_delay(self):
+        with self._lock:
+            if len(self.latencies) < LATENCY_SAMPLES // 5:
+                return HEDGE_DELAY
+            latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * HEDGE_PERCENTILE / 100))
+        return max(HEDGE_MIN_DELAY, latencies[index])
+
+    def succeeded(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.failures = 0
+
+    def rate_limited(self, retry_after):
+        now = time.monotonic()
+        with self._lock:
+            self.cooldown_until = max(self.cooldown_until, now + retry_after)
+            # Our estimate of the remaining budget was wrong, start counting again from nothing
+            if self.tokens is not None:
+                self.tokens.empty(now)
+            if self.requests is not None:
+                self.requests.empty(now)
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            cooldown = min(MAX_COOLDOWN, FAILURE_COOLDOWN * 2 ** (self.failures - 1))
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+            return cooldown
+
+def rate_limit_delay(error):
+    """
+    Returns how long to back off if error is an HTTP 429 from any provider's client, else None.
+
+    Groq's client errors carry status_code and response, requests' HTTPError carries response.
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    if status != 429:
+        return None
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return RATE_LIMIT_COOLDOWN
+
+class RouterError(RuntimeError):
+    pass
+
+class _Attempt:
+    __slots__ = ('provider', 'tokens', 'started')
+
+    def __init__(self, provider, tokens):
+        self.provider = provider
+        self.tokens = tokens
+        self.started = time.monotonic()
+
+class Router(Backend):
+    """
+    Spreads completions over several backends by their rate limits and health.
+
+    Each provider has token buckets for its requests and tokens per minute, and
+    a request goes to the first provider, in priority order, with room for it.
+    When none has room the request waits for the earliest one instead of
+    getting a 429. A 429 or error puts the provider on cooldown and sends the
+    request on to the next one. A request that is slower than its provider
+    usually is gets hedged to a second provider, and whichever answers first
+    wins.
+    """
+
+    name = 'router'
+
+    def __init__(self, providers=None, max_queue_wait=MAX_QUEUE_WAIT):
+        if providers is None:
+            providers = [Provider(name, **PROVIDER_LIMITS.get(name, {}))
+                         for name in (name.strip() for name in PROVIDERS.split(',')) if name]
+        if not providers:
+            raise ValueError("The LLM router needs at least one provider")
+        self.providers = providers
+        self.model = '+'.join(provider.name for provider in providers)
+        self.max_queue_wait = max_queue_wait
+        self._executor = ThreadPoolExecutor(max_workers=ROUTER_THREADS, thread_name_prefix='llm-router')
+        logger.info(f"LLM router using {self.model}")
+
+    def _acquire(self, tokens, excluded, deadline=None):
+        # Returns the first provider with room for the request, waiting up to deadline for one.
+        # Checks run under _released, so a release between a check and the wait can't be missed.
+        with _released:
+            while True:
+                soonest = None
+                busy = False
+                for provider in self.providers:
+                    if provider.name in excluded:
+                        continue
+                    if provider.try_acquire(tokens):
+                        return provider
+                    wait_time = provider.wait_time(tokens, time.monotonic())
+                    if wait_time is None:
+                        busy = True
+                    elif soonest is None or wait_time < soonest:
+                        soonest = wait_time
+                if deadline is None or not any(provider.name not in excluded for provider in self.providers):
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (not busy and soonest is not None and soonest > remaining):
+                    return None
+                # Busy providers free up when a request finishes, which notifies _released; rate limits and
+                # cooldowns free up by the clock
+                _released.wait(min(soonest if soonest is not None else remaining, remaining) or 0.01)
+
+    def _call(self, attempt, request):
+        try:
+            return request(get_backend(attempt.provider.name))
+        except BaseException:
+            attempt.provider.release()
+            raise
+
+    def _run(self, request, tokens, discard):
+        """
+        Runs request(backend) on providers until one succeeds.
+
+        Losing hedged attempts are passed to discard(result) once they finish.
+        """
+        deadline = time.monotonic() + self.max_queue_wait
+        pending = {}
+        excluded = set()
+        attempts = 0
+        last_error = None
+        can_hedge = True
+        while True:
+            if not pending:
+                if attempts >= MAX_ATTEMPTS:
+                    break
+                waited = time.monotonic()
+                provider = self._acquire(tokens, excluded, deadline)
+                if provider is None:
+                    break
+                waited = time.monotonic() - waited
+                if waited > 0.01:
+                    metrics.observe('llm_router_wait', waited, provider=provider.name)
+                if attempts:
+                    metrics.incr('llm_router_failovers', provider=provider.name)
+                attempts += 1
+                attempt = _Attempt(provider, tokens)
+                pending[self._executor.submit(self._call, attempt, request)] = attempt
+                excluded.add(provider.name)
+                can_hedge = True
+
+            timeout = min(attempt.provider.hedge_delay() - (time.monotonic() - attempt.started)
+                          for attempt in pending.values()) if can_hedge else None
+            done, _ = wait(pending, timeout=max(0.0, timeout) if timeout is not None else None,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                hedge = self._acquire(tokens, excluded) if attempts < MAX_ATTEMPTS else None
+                if hedge is None:
+                    can_hedge = False
+                    continue
+                logger.info(f"Hedging slow LLM request to {hedge.name}")
+                metrics.incr('llm_router_hedges', provider=hedge.name)
+                attempts += 1
+                attempt = _Attempt(hedge, tokens)
+                pending[self._executor.submit(self._call, attempt, request)] = attempt
+                excluded.add(hedge.name)
+                continue
+
+            for future in done:
+                attempt = pending.pop(future)
+                provider = attempt.provider
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    retry_after = rate_limit_delay(e)
+                    if retry_after is not None:
+                        logger.warning(f"{provider.name} is rate limiting us, resting it for {retry_after:.0f}s")
+                        metrics.incr('llm_rate_limited', provider=provider.name)
+                        provider.rate_limited(retry_after)
+                        # Throttling is temporary, the request may come back once the cooldown is over
+                        excluded.discard(provider.name)
+                    else:
+                        cooldown = provider.failed()
+                        logger.error(f"Error from LLM provider {provider.name}, resting it for {cooldown:.0f}s: {e}")
+                        metrics.incr('errors', stage='llm', backend=provider.name)
+                    continue
+                provider.succeeded(time.monotonic() - attempt.started)
+                metrics.incr('llm_router_requests', provider=provider.name)
+                for loser, loser_attempt in pending.items():
+                    loser.add_done_callback(_discarder(loser_attempt, discard))
+                return provider, result
+
+        raise RouterError(f"No LLM provider could complete the request after {attempts} attempts"
+                          + (f", last error: {last_error}" if last_error else ""))
+
+    def _estimate(self, text, system_prompt, max_tokens):
+        return count_tokens(system_prompt) + count_tokens(text) + max_tokens
+
+    def complete(self, text, system_prompt, max_tokens):
+        tokens = self._estimate(text, system_prompt, max_tokens)
+        provider, output = self._run(lambda backend: backend.complete(text, system_prompt, max_tokens), tokens,
+                                     discard=lambda output: None)
+        provider.release(max_tokens - count_tokens(output or ''))
+        return output
+
+    def stream(self, text, system_prompt, max_tokens, json_mode=False):
+        """
+        Streams from the first provider to produce a chunk. Hedging and failover only
+        happen before the first chunk, after that the stream belongs to one provider.
+        """
+        tokens = self._estimate(text, system_prompt, max_tokens)
+
+        def start(backend):
+            chunks = backend.stream(text, system_prompt, max_tokens, json_mode=json_mode)
+            return chunks, next(chunks, '')
+
+        provider, (chunks, first) = self._run(start, tokens, discard=lambda started: started[0].close())
+        received = 0
+        try:
+            if first:
+                received += len(first)
+                yield first
+            for chunk in chunks:
+                received += len(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+            # Roughly four characters a token
+            provider.release(max_tokens - received // 4)
+
+def _discarder(attempt, discard):
+    # Cleans up after a hedged attempt that lost the race, once it finishes
+    def callback(future):
+        try:
+            result = future.result()
+        except Exception as e:
+            retry_after = rate_limit_delay(e)
+            if retry_after is not None:
+                attempt.provider.rate_limited(retry_after)
+            return
+        attempt.provider.succeeded(time.monotonic() - attempt.started)
+        attempt.provider.release()
+        try:
+            discard(result)
+        except Exception as e:
+            logger.warning(f"Error discarding hedged response from {attempt.provider.name}: {e}")
+    return callback
+
+register_backend(Router.name, Router)
@@ -0,0 +1,171 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+MISTRAL_MODEL = "mistralai/Mistral-7B-Instruct-v0.3"
+
+BATCH_SIZE = 8
+# How long the queue waits for more prompts before running a partial batch
+BATCH_WAIT = 0.05
+MAX_INPUT_TOKENS = 4096
+
+def select_device(preferred=None):
+    """
+    Picks the torch device at runtime: the preferred one if given, else cuda, mps, then cpu.
+    """
+    import torch
+    if preferred:
+        return torch.device(preferred)
+    if torch.cuda.is_available():
+        return torch.device('cuda')
+    if getattr(torch.backends, 'mps', None) and torch.backends.mps.is_available():
+        return torch.device('mps')
+    return torch.device('cpu')
+
+class LocalModel:
+    """
+    A causal LM that generates for batches of prompts.
+
+    The model is loaded on first use. Prompts are sorted by token length and
+    split into batches of similar length, so little of each forward pass is
+    spent on padding.
+    """
+
+    def __init__(self, model_name=MISTRAL_MODEL, device=None, quantize=False, batch_size=BATCH_SIZE):
+        self.model_name = model_name
+        self.device_name = device
+        self.quantize = quantize
+        self.batch_size = batch_size
+        self.tokenizer = None
+        self.model = None
+        self.device = None
+        self.tokens_generated = 0
+        self.generation_seconds = 0.0
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        with self._load_lock:
+            if self.model is not None:
+                return
+            import torch
+            from transformers import AutoTokenizer, AutoModelForCausalLM
+
+            self.device = select_device(self.device_name)
+            logger.info(f"Loading {self.model_name} on {self.device}")
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, padding_side='left')
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            model = AutoModelForCausalLM.from_pretrained(self.model_name)
+            model.eval()
+            if self.quantize:
+                if self.device.type == 'cpu':
+                    # Dynamic int8 quantization of the linear layers, CPU only
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                else:
+                    logger.warning(f"int8 quantization is only supported on cpu, ignoring it on {self.device}")
+            self.model = model.to(self.device)
+
+    def buckets(self, prompts):
+        """
+        Yields lists of prompt indexes, grouped by similar token length.
+        """
+        lengths = [len(ids) for ids in self.tokenizer(prompts, add_special_tokens=True)['input_ids']]
+        order = sorted(range(len(prompts)), key=lambda i: lengths[i])
+        for start in range(0, len(order), self.batch_size):
+            yield order[start:start + self.batch_size]
+
+    def generate_batch(self, prompts, max_new_tokens):
+        """
+        Generates a completion for every prompt.
+
+        Args:
+            prompts (list of str): The prompts to complete.
+            max_new_tokens (int): Maximum tokens generated per prompt.
+
+        Returns:
+            list of str: Completions, in the same order as prompts.
+        """
+        import torch
+        self.load()
+        results = [None] * len(prompts)
+        for indexes in self.buckets(prompts):
+            batch = [prompts[i] for i in indexes]
+            inputs = self.tokenizer(batch, return_tensors='pt', padding=True, truncation=True,
+                                    max_length=MAX_INPUT_TOKENS).to(self.device)
+            start = time.perf_counter()
+            with torch.inference_mode():
+                outputs = self.model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                              pad_token_id=self.tokenizer.pad_token_id)
+            elapsed = time.perf_counter() - start
+
+            # Left padding means every prompt ends at the same column, completions start there
+            new_tokens = outputs[:, inputs['input_ids'].shape[1]:]
+            generated = int((new_tokens != self.tokenizer.pad_token_id).sum())
+            self.tokens_generated += generated
+            self.generation_seconds += elapsed
+            logger.info(f"Generated {generated} tokens for {len(batch)} prompts in {elapsed:.2f}s "
+                        f"({generated / elapsed if elapsed else 0:.1f} tokens/sec)")
+            for i, decoded in zip(indexes, self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)):
+                results[i] = decoded
+        return results
+
+    def tokens_per_second(self):
+        return self.tokens_generated / self.generation_seconds if self.generation_seconds else 0.0
+
+class BatchQueue:
+    """
+    Feeds prompts from many callers into shared batched forward passes.
+
+    submit() returns a Future. A background thread drains the queue, waiting
+    up to batch_wait seconds to fill a batch, and runs it through the model.
+    """
+
+    def __init__(self, model, batch_wait=BATCH_WAIT):
+        self.model = model
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, prompt, max_new_tokens):
+        future = Future()
+        self._queue.put((prompt, max_new_tokens, future))
+        self._ensure_worker()
+        return future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='local-model-batcher', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.model.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # One generate call per batch, so use the largest token limit asked for
+            max_new_tokens = max(item[1] for item in batch)
+            try:
+                outputs = self.model.generate_batch([item[0] for item in batch], max_new_tokens)
+                for (_, _, future), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                logger.error(f"Error running local model batch: {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
@@ -1,69 +1,318 @@
+import argparse
+import asyncio
 import logging
-import requests
-from src.fetcher import fetch_sitemap, fetch_and_process_pages
-from src.parser import extract_sitemap_urls, extract_search_results, extract_wait_times
-from src.database import init_db, drop_tables, save_web_page, update_last_fetched, get_unprocessed_urls, save_wait_time
-from src.crawler import crawl_site
-from src.searcher import search_site
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from src import metrics
 
-logging.basicConfig(filename='logs/scraper.log', level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# The pipeline (requests, bs4, SQLAlchemy) is imported by the functions that run it,
+# so starting the CLI, e.g. for --help, stays fast. See scripts/benchmark_import_time.py.
 
 logger = logging.getLogger(__name__)
 
-def main():
-    drop_tables()  # Drop existing tables
-    init_db()  # Initialize the database and create tables
-    logger.info("Database initialized")
+# Define the keywords to use for crawling
+KEYWORDS = ['ER wait times', 'emergency room wait', 'wait time']
+
+# Defaults for the async run mode
+CONCURRENCY = 20
+PER_HOST_CONCURRENCY = 2
+PER_HOST_INTERVAL = 1.0
+
+# How often the daemon looks for newly added hospitals, in seconds
+RELOAD_INTERVAL = 300
+
+def discover_pages(hospital_id, hospital_url, keywords):
+    from src import searcher, crawler
+    from src.parser import extract_search_results
+    from src.fetcher import fetch_and_process_pages
+    from src.discovery import record_pages
+    # Try site search
+    search_query = 'ER wait times'
+    logger.info(f"Searching site with query: {search_query}")
+    search_soup = searcher.search_site(hospital_url, search_query)
+    search_results = extract_search_results(search_soup) if search_soup else []
+    logger.info(f"Search results: {search_results}")
+
+    search_results = [url for url in search_results if url.startswith('https://')]
+
+    # If search is successful, fetch and process pages for the search results
+    if search_results:
+        logger.info(f"Found search results. Fetching and processing pages.")
+        urls = search_results
+    else:
+        # If search fails, try crawling
+        logger.info(f"Search failed. Crawling the site.")
+        urls = crawler.crawl_site(hospital_url, keywords)
+    pages = fetch_and_process_pages(hospital_id, urls, keywords)
+    record_pages(hospital_id, urls, pages)
+    return pages
+
+def process_hospital(hospital_id, hospital_url, keywords, writer):
+    from src.fetcher import fetch_and_process_pages
+    from src.discovery import known_urls, record_pages
+    logger.info(f"Scraping data for hospital: {hospital_url}")
+    try:
+        # Fetch the wait time pages found on earlier runs, and only search/crawl again when they stop working:
+        # a page is dropped from known_urls after discovery.MAX_FAILURES consecutive refreshes without a wait
+        # time, a single miss (e.g. the hospital briefly not posting one) keeps it
+        urls = known_urls(hospital_id)
+        pages = None
+        if urls:
+            logger.info(f"Fetching {len(urls)} known wait time pages")
+            pages = fetch_and_process_pages(hospital_id, urls, keywords)
+            if not record_pages(hospital_id, urls, pages):
+                if pages:
+                    logger.info(f"Known pages yielded no wait time this time, keeping them")
+                else:
+                    # Every known page errored or is gone (e.g. 404), nothing left to retry
+                    logger.info(f"Known pages could not be fetched, rediscovering")
+                    pages = None
+        if pages is None:
+            pages = discover_pages(hospital_id, hospital_url, keywords)
+
+        for page in pages:
+            writer.add_web_page(page['hospital_id'], page['url'], page['content'])
+            # Wait times were validated against the extraction schema in fetch_and_process_pages
+            if page['wait_time_minutes'] is not None:
+                writer.add_wait_time(page['hospital_id'], page['wait_time_minutes'])
 
-    # Fetch URLs from the database
-    hospital_urls = get_unprocessed_urls()
+        # Update the last fetched timestamp for the hospital URL
+        writer.mark_fetched(hospital_id)
+        logger.info(f"Updated last fetched timestamp for hospital ID: {hospital_id}")
 
-    # Define the keywords to use for crawling
-    keywords = ['ER wait times', 'emergency room wait', 'wait time']
+        logger.info("Scraping completed. Processed URLs:")
+        for page in pages:
+            logger.info(page['url'])
+        return pages
+    except Exception as e:
+        logger.error(f"An error occurred while scraping data for hospital {hospital_url}: {e}")
+        return None
 
-    # Process each hospital URL
-    for hospital_id, hospital_url in hospital_urls:
-        logger.info(f"Scraping data for hospital: {hospital_url}")
+class HostLimiter:
+    """
+    Per-host politeness limits for the async run mode.
+
+    Caps how many hospitals on the same domain are in flight at once and
+    enforces a minimum interval between starting work on that domain.
+    """
+
+    def __init__(self, max_concurrency=PER_HOST_CONCURRENCY, min_interval=PER_HOST_INTERVAL):
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self._semaphores = {}
+        self._locks = {}
+        self._next_start = {}
+
+    async def acquire(self, host):
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.max_concurrency))
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        await semaphore.acquire()
+        async with lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def release(self, host):
+        self._semaphores[host].release()
+
+async def process_hospital_async(hospital_id, hospital_url, keywords, writer, global_limit, host_limiter, scheduler):
+    host = urlparse(hospital_url).netloc.lower()
+    async with global_limit:
+        await host_limiter.acquire(host)
         try:
-            # Try site search
-            search_query = 'ER wait times'
-            logger.info(f"Searching site with query: {search_query}")
-            search_soup = search_site(hospital_url, search_query)
-            search_results = extract_search_results(search_soup) if search_soup else []
-            logger.info(f"Search results: {search_results}")
-
-            search_results = [url for url in search_results if url.startswith('https://')]
-
-            # If search is successful, fetch and process pages for the search results
-            if search_results:
-                logger.info(f"Found search results. Fetching and processing pages.")
-                pages = fetch_and_process_pages(hospital_id, search_results, keywords)
-                for page in pages:
-                    save_web_page(page['hospital_id'], page['url'], page['content'])
-                    wait_times = extract_wait_times(page['content'])
-                    for wait_time in wait_times:
-                        save_wait_time(page['hospital_id'], wait_time)
+            # The stages use blocking requests/Groq calls, so run them off the event loop
+            pages = await asyncio.to_thread(process_hospital, hospital_id, hospital_url, keywords, writer)
+        finally:
+            host_limiter.release(host)
+    await asyncio.to_thread(scheduler.record_result, hospital_id, pages)
+    return pages
+
+def start_run(concurrency):
+    from src.database import init_db
+    from src.scheduler import RefreshScheduler
+    from src.fetcher import enable_batching
+    init_db()  # Create any missing tables, history is kept between runs
+    logger.info("Database initialized")
+
+    scheduler = RefreshScheduler()
+    scheduler.load()
+
+    # Threads are the real workers behind asyncio.to_thread, size the pool to match
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    # Many hospitals are in flight at once, so their LLM extractions can share requests
+    enable_batching()
+    return scheduler
+
+async def main_async(concurrency=CONCURRENCY, per_host_concurrency=PER_HOST_CONCURRENCY,
+                     per_host_interval=PER_HOST_INTERVAL):
+    from src.database import BufferedWriter
+    from src.extraction_cache import extraction_cache
+    scheduler = start_run(concurrency)
+    hospital_urls = scheduler.pop_due()
+
+    global_limit = asyncio.Semaphore(concurrency)
+    host_limiter = HostLimiter(per_host_concurrency, per_host_interval)
+
+    writer = BufferedWriter()
+
+    start = time.monotonic()
+    tasks = [
+        asyncio.create_task(process_hospital_async(hospital_id, hospital_url, KEYWORDS, writer, global_limit,
+                                                   host_limiter, scheduler))
+        for hospital_id, hospital_url in hospital_urls
+    ]
+
+    done = succeeded = 0
+    for task in asyncio.as_completed(tasks):
+        if await task is not None:
+            succeeded += 1
+        done += 1
+        if done % 50 == 0:
+            elapsed = time.monotonic() - start
+            logger.info(f"Progress: {done}/{len(tasks)} hospitals, {done / elapsed:.2f} hospitals/sec")
+    await asyncio.to_thread(writer.close)
+
+    elapsed = time.monotonic() - start
+    rate = done / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Processed {done} hospitals ({succeeded} succeeded) in {elapsed:.1f}s: {rate:.2f} hospitals/sec")
+    logger.info(f"Extraction cache: {extraction_cache.stats()}")
+    return rate
+
+async def run_daemon(concurrency=CONCURRENCY, per_host_concurrency=PER_HOST_CONCURRENCY,
+                     per_host_interval=PER_HOST_INTERVAL):
+    """
+    Refreshes hospitals continuously as they come due on the refresh schedule.
+    """
+    from src.database import BufferedWriter
+    scheduler = start_run(concurrency)
+    global_limit = asyncio.Semaphore(concurrency)
+    host_limiter = HostLimiter(per_host_concurrency, per_host_interval)
+    writer = BufferedWriter()
+    in_flight = set()
+    last_reload = start = time.monotonic()
+    done = 0
+
+    logger.info(f"Refresh daemon started with {len(scheduler)} hospitals")
+    try:
+        while True:
+            if time.monotonic() - last_reload >= RELOAD_INTERVAL:
+                await asyncio.to_thread(scheduler.load)
+                last_reload = time.monotonic()
+
+            # Only take as many due hospitals as there are free slots, the rest stay queued by due time
+            for hospital_id, hospital_url in scheduler.pop_due(limit=concurrency - len(in_flight)):
+                task = asyncio.create_task(process_hospital_async(hospital_id, hospital_url, KEYWORDS, writer,
+                                                                  global_limit, host_limiter, scheduler))
+                in_flight.add(task)
+
+            until_reload = max(0.0, RELOAD_INTERVAL - (time.monotonic() - last_reload))
+            if len(in_flight) >= concurrency:
+                # Overdue hospitals can't start until a slot frees up, waiting on their due time would spin
+                timeout = until_reload
+            else:
+                wait = scheduler.seconds_until_next()
+                timeout = until_reload if wait is None else min(wait, until_reload)
+            if in_flight:
+                finished, in_flight = await asyncio.wait(in_flight, timeout=timeout,
+                                                         return_when=asyncio.FIRST_COMPLETED)
+                done += len(finished)
+                if done // 50 != (done - len(finished)) // 50:
+                    elapsed = time.monotonic() - start
+                    logger.info(f"Refreshed {done} hospitals, {done / elapsed:.2f} hospitals/sec")
             else:
-                # If search fails, try crawling
-                logger.info(f"Search failed. Crawling the site.")
-                found_urls = crawl_site(hospital_url, keywords)
-                pages = fetch_and_process_pages(hospital_id, found_urls, keywords)
-                for page in pages:
-                    save_web_page(page['hospital_id'], page['url'], page['content'])
-                    wait_times = extract_wait_times(page['content'])
-                    for wait_time in wait_times:
-                        save_wait_time(page['hospital_id'], wait_time)
-
-            # Update the last fetched timestamp for the hospital URL
-            update_last_fetched(hospital_id)
-            logger.info(f"Updated last fetched timestamp for hospital ID: {hospital_id}")
-
-            logger.info("Scraping completed. Processed URLs:")
-            for page in pages:
-                logger.info(page['url'])
-        except Exception as e:
-            logger.error(f"An error occurred while scraping data for hospital {hospital_url}: {e}")
+                await asyncio.sleep(timeout)
+    finally:
+        await asyncio.to_thread(writer.close)
+
+def main():
+    from src.database import init_db, BufferedWriter
+    from src.scheduler import RefreshScheduler
+    from src.extraction_cache import extraction_cache
+    init_db()  # Create any missing tables, history is kept between runs
+    logger.info("Database initialized")
+
+    # Fetch the hospitals that are due for a refresh
+    scheduler = RefreshScheduler()
+    scheduler.load()
+    hospital_urls = scheduler.pop_due()
+
+    # Process each hospital URL, writes are flushed in batches
+    with BufferedWriter() as writer:
+        for hospital_id, hospital_url in hospital_urls:
+            pages = process_hospital(hospital_id, hospital_url, KEYWORDS, writer)
+            scheduler.record_result(hospital_id, pages)
+    logger.info(f"Extraction cache: {extraction_cache.stats()}")
+
+def configure_logging():
+    # Configured from the entry point so importing this module doesn't create log files
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(filename='logs/scraper.log', level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Scrape hospital ER wait times.')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Process many hospitals concurrently with asyncio.')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Run continuously, refreshing each hospital when it is due.')
+    parser.add_argument('--record', metavar='DIR',
+                        help='Save every HTTP and LLM response to a replay corpus in DIR.')
+    parser.add_argument('--replay', metavar='DIR',
+                        help='Serve HTTP and LLM responses from the replay corpus in DIR, fully offline.')
+    parser.add_argument('--workers', type=int,
+                        help='Process hospitals in this many worker processes sharing a database-backed queue. '
+                             'Run on several machines against the same database to scale out.')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help='Maximum number of hospitals in flight at once (per worker with --workers).')
+    parser.add_argument('--per-host-concurrency', type=int, default=PER_HOST_CONCURRENCY,
+                        help='Maximum number of hospitals in flight per domain.')
+    parser.add_argument('--per-host-interval', type=float, default=PER_HOST_INTERVAL,
+                        help='Minimum seconds between starting work on the same domain.')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Collect metrics and serve them at http://127.0.0.1:PORT/metrics (Prometheus text). '
+                             'With --workers, worker i serves its own on PORT + 1 + i.')
+    parser.add_argument('--metrics-dump', metavar='PATH',
+                        help='Collect metrics and write a JSON snapshot to PATH periodically and on exit. '
+                             'With --workers, worker i writes its own next to it, e.g. PATH.w0.json.')
+    parser.add_argument('--metrics-interval', type=float, default=metrics.DUMP_INTERVAL,
+                        help='Seconds between JSON metrics snapshots.')
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    configure_logging()
+    from src import replay
+    from src.database import get_hospitals
+    from src.worker_pool import run_pool
+    if args.record:
+        corpus = replay.install('record', args.record)
+        corpus.save_hospitals(get_hospitals())
+    elif args.replay:
+        replay.install('replay', args.replay)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.metrics_dump:
+        metrics.start_json_dumper(args.metrics_dump, args.metrics_interval)
+    try:
+        if args.workers:
+            run_pool(args.workers, args.concurrency, daemon=args.daemon, settings={
+                'replay_mode': 'record' if args.record else 'replay' if args.replay else None,
+                'replay_dir': args.record or args.replay,
+                'metrics_port': args.metrics_port,
+                'metrics_dump': args.metrics_dump,
+                'metrics_interval': args.metrics_interval,
+            })
+        elif args.daemon:
+            asyncio.run(run_daemon(args.concurrency, args.per_host_concurrency, args.per_host_interval))
+        elif args.use_async:
+            asyncio.run(main_async(args.concurrency, args.per_host_concurrency, args.per_host_interval))
+        else:
+            main()
+    finally:
+        if args.metrics_dump:
+            metrics.dump_json(args.metrics_dump)
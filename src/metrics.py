@@ -0,0 +1,229 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Off unless HOSPITAL_METRICS is set or enable() is called, a disabled hook is a single flag check
+_enabled = os.environ.get('HOSPITAL_METRICS', '') not in ('', '0')
+
+PREFIX = 'hospitalscrape'
+
+# Upper bounds in seconds of the span duration histogram buckets
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DUMP_INTERVAL = 60
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_spans = {}  # (name, labels) -> [count, sum, max, per-bucket counts]
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def enabled():
+    return _enabled
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def incr(name, value=1, **labels):
+    """
+    Adds value to the counter called name, e.g. incr('bytes_fetched', len(body)).
+    """
+    if not _enabled:
+        return
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    """
+    Records one duration of the span called name.
+    """
+    if not _enabled:
+        return
+    key = (name, _labels_key(labels))
+    with _lock:
+        span = _spans.get(key)
+        if span is None:
+            span = _spans[key] = [0, 0.0, 0.0, [0] * (len(SPAN_BUCKETS) + 1)]
+        span[0] += 1
+        span[1] += seconds
+        span[2] = max(span[2], seconds)
+        span[3][bisect.bisect_left(SPAN_BUCKETS, seconds)] += 1
+
+class _Span:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            incr('errors', stage=self.name, **self.labels)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name, **labels):
+    """
+    Context manager that times the enclosed block as the span called name.
+    """
+    return _Span(name, labels) if _enabled else _NOOP_SPAN
+
+def timed(name, **labels):
+    """
+    Decorator that times every call of the function as the span called name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot():
+    """
+    Returns the current counters and span statistics as a JSON-serializable dict.
+    """
+    with _lock:
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(_counters.items())]
+        spans = [{'name': name, 'labels': dict(labels), 'count': count, 'sum': total, 'max': longest,
+                  'mean': total / count if count else 0.0,
+                  'buckets': dict(zip([str(bound) for bound in SPAN_BUCKETS] + ['+Inf'], buckets))}
+                 for (name, labels), (count, total, longest, buckets) in sorted(_spans.items())]
+    return {'timestamp': time.time(), 'counters': counters, 'spans': spans}
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+def render_prometheus():
+    """
+    Returns the metrics in the Prometheus text exposition format.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        spans = sorted(_spans.items())
+    lines = []
+    declared = set()
+    for (name, labels), value in counters:
+        metric = f'{PREFIX}_{name}_total'
+        if metric not in declared:
+            lines.append(f'# TYPE {metric} counter')
+            declared.add(metric)
+        lines.append(f'{metric}{_format_labels(labels)} {value}')
+    if spans:
+        metric = f'{PREFIX}_span_duration_seconds'
+        lines.append(f'# TYPE {metric} histogram')
+        for (name, labels), (count, total, _, buckets) in spans:
+            labels = (('span', name),) + labels
+            cumulative = 0
+            for bound, bucket in zip(list(SPAN_BUCKETS) + ['+Inf'], buckets):
+                cumulative += bucket
+                lines.append(f'{metric}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+def dump_json(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp_path, path)
+
+def start_json_dumper(path, interval=DUMP_INTERVAL):
+    """
+    Enables metrics and writes a JSON snapshot to path every interval seconds from a daemon thread.
+    """
+    enable()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_json(path)
+            except OSError as e:
+                logger.error(f"Failed to dump metrics to {path}: {e}")
+
+    thread = threading.Thread(target=run, name='metrics-dumper', daemon=True)
+    thread.start()
+    logger.info(f"Dumping metrics to {path} every {interval}s")
+    return thread
+
+def serve(port, host='127.0.0.1'):
+    """
+    Enables metrics and serves /metrics (Prometheus text) and /metrics.json from a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server, call shutdown() to stop it.
+    """
+    # http.server is only imported when metrics are actually served, keeping startup imports small
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/metrics':
+                body, content_type = render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+            elif path == '/metrics.json':
+                body, content_type = json.dumps(snapshot()), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    enable()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
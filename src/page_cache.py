@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only one process should use a cache directory
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_DIR = os.path.join('cache', 'pages')
+PAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Worker processes share the directory, so each one re-reads its real size from disk after writing this
+# fraction of max_bytes itself, and eviction goes down to PAGE_CACHE_EVICT_TO so it doesn't rescan on every write
+PAGE_CACHE_RESCAN_FRACTION = 1 / 16
+PAGE_CACHE_EVICT_TO = 0.9
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+class PageCache:
+    """
+    On-disk cache of fetched pages keyed by URL.
+
+    Each entry keeps the page body, its ETag/Last-Modified validators, a hash
+    of the content and the extraction result produced for that content, so an
+    unchanged page can skip both the download and the LLM call. The directory
+    is kept under max_bytes by evicting the least recently used entries.
+
+    Several processes may share the directory: the in-memory size index only
+    sees this process's writes, so it is rebuilt from disk, under a lock file,
+    before evicting and after every PAGE_CACHE_RESCAN_FRACTION of max_bytes
+    written. The directory can overshoot max_bytes by at most that fraction
+    per process.
+    """
+
+    def __init__(self, directory=PAGE_CACHE_DIR, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = None  # path -> size, least recently used first
+        self._total = 0
+        self._unscanned = 0  # Bytes this process wrote since the index was last read from disk
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _load_sizes(self):
+        # Build the size index on first use so constructing the cache touches nothing on disk
+        if self._sizes is None:
+            self._scan()
+
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # Evicted by another process meanwhile
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        # Entries' mtimes carry their recency across runs and processes, between scans the order is kept in memory
+        self._sizes = OrderedDict((path, size) for _, path, size in sorted(entries))
+        self._total = sum(self._sizes.values())
+        self._unscanned = 0
+
+    def _directory_lock(self):
+        # Serializes rescans and evictions between processes sharing the directory
+        lock_file = open(os.path.join(self.directory, '.lock'), 'a')
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file  # Closing it releases the lock
+
+    def _touch(self, path):
+        with self._lock:
+            if self._sizes is not None and path in self._sizes:
+                self._sizes.move_to_end(path)
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used for eviction after a restart
+            self._touch(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable page cache entry for {url}: {e}")
+            return None
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, content, etag=None, last_modified=None, extraction=None):
+        """
+        Stores a page, keeping the previous extraction if the content is unchanged.
+        """
+        previous = self.get(url)
+        digest = content_hash(content)
+        if extraction is None and previous and previous.get('content_hash') == digest:
+            extraction = previous.get('extraction')
+        entry = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_hash': digest,
+            'content': content,
+            'extraction': extraction,
+            'stored_at': time.time(),
+        }
+        self._write(url, entry)
+        return entry
+
+    def get_extraction(self, url, content):
+        """
+        Returns the cached extraction result if content matches what was last extracted.
+        """
+        entry = self.get(url)
+        if entry and entry.get('extraction') is not None and entry.get('content_hash') == content_hash(content):
+            return entry['extraction']
+        return None
+
+    def set_extraction(self, url, content, extraction):
+        entry = self.get(url) or {}
+        self.put(url, content, entry.get('etag'), entry.get('last_modified'), extraction)
+
+    def _write(self, url, entry):
+        path = self._path(url)
+        data = json.dumps(entry).encode('utf-8')
+        with self._lock:
+            self._load_sizes()
+            # Unique per process and thread, worker processes share the directory
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._total += len(data) - self._sizes.get(path, 0)
+            self._sizes[path] = len(data)
+            self._sizes.move_to_end(path)
+            self._unscanned += len(data)
+            if self._total > self.max_bytes or self._unscanned >= self.max_bytes * PAGE_CACHE_RESCAN_FRACTION:
+                with self._directory_lock():
+                    self._scan()
+                    if self._total > self.max_bytes:
+                        self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes * PAGE_CACHE_EVICT_TO and self._sizes:
+            path, size = self._sizes.popitem(last=False)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total -= size
+        logger.info(f"Evicted page cache entries, {self._total} bytes remain")
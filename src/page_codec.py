@@ -0,0 +1,49 @@
+import hashlib
+import zlib
+
+# zstd is optional: pages are zstd-compressed when the zstandard package is installed, zlib otherwise.
+# The encoding is stored with every body, so stores written with either can be read back.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+def body_hash(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+def compress(raw, base=None):
+    """
+    Compresses a page body, optionally as a delta against a previous version.
+
+    The previous version is used as a raw-content dictionary, so text the two
+    versions share costs almost nothing. zlib only looks back 32 KB into it.
+
+    Args:
+        raw (bytes): The page body.
+        base (bytes, optional): The previous version of the page.
+
+    Returns:
+        tuple: (encoding, compressed bytes)
+    """
+    if zstandard is not None:
+        dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if base else None
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(raw)
+    compressor = zlib.compressobj(ZLIB_LEVEL, zdict=base) if base else zlib.compressobj(ZLIB_LEVEL)
+    return 'zlib', compressor.compress(raw) + compressor.flush()
+
+def decompress(encoding, data, base=None):
+    """
+    Reverses compress(). base must be the same previous version the body was compressed against.
+    """
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This page body is zstd-compressed, install the zstandard package to read it")
+        dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if base else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+    if encoding == 'zlib':
+        decompressor = zlib.decompressobj(zdict=base) if base else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+    raise ValueError(f"Unknown page body encoding {encoding!r}")
@@ -0,0 +1,111 @@
+import argparse
+import logging
+from sqlalchemy import select, func
+from .database import get_engine, WebPage, PageBody, load_page_body, store_page_bodies
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip when streaming pages
+STREAM_BATCH_SIZE = 200
+# Decompressed bodies kept while streaming, so delta bases shared by many rows are read once
+BODY_CACHE_SIZE = 64
+
+def get_page_content(web_page_id):
+    """
+    Returns the content of one stored web page, or None if it doesn't exist.
+    """
+    pages = WebPage.__table__
+    try:
+        with get_engine().connect() as conn:
+            row = conn.execute(select(pages.c.content, pages.c.content_hash)
+                               .where(pages.c.id == web_page_id)).one_or_none()
+            if row is None:
+                return None
+            if row.content_hash is None:
+                return row.content
+            return load_page_body(conn, row.content_hash).decode('utf-8')
+    except Exception as e:
+        logger.error(f"Failed to load web page {web_page_id}: {e}")
+        return None
+
+def iter_page_contents(hospital_id=None, since=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Streams stored web pages oldest first, decompressing one at a time.
+
+    Rows come from a server-side cursor in batches of batch_size, so memory
+    stays flat however many pages are read.
+
+    Args:
+        hospital_id (int, optional): Only pages of this hospital.
+        since (datetime, optional): Only pages fetched at or after this time.
+
+    Yields:
+        dict: {'id', 'hospital_id', 'page_url', 'fetched_at', 'content'}
+    """
+    pages = WebPage.__table__
+    query = select(pages.c.id, pages.c.hospital_id, pages.c.page_url, pages.c.fetched_at,
+                   pages.c.content, pages.c.content_hash).order_by(pages.c.id)
+    if hospital_id is not None:
+        query = query.where(pages.c.hospital_id == hospital_id)
+    if since is not None:
+        query = query.where(pages.c.fetched_at >= since)
+    # Bodies are read on a second connection, the first one is busy streaming rows
+    with get_engine().connect() as conn, get_engine().connect() as body_conn:
+        cache = {}
+        for row in conn.execution_options(stream_results=True, yield_per=batch_size).execute(query):
+            if row.content_hash is None:
+                content = row.content
+            else:
+                if len(cache) > BODY_CACHE_SIZE:
+                    cache.clear()
+                content = load_page_body(body_conn, row.content_hash, cache).decode('utf-8')
+            yield {'id': row.id, 'hospital_id': row.hospital_id, 'page_url': row.page_url,
+                   'fetched_at': row.fetched_at, 'content': content}
+
+def migrate_page_contents(batch_size=STREAM_BATCH_SIZE):
+    """
+    Moves content stored inline in web_pages into page_bodies, batch_size rows per transaction.
+
+    Returns:
+        int: The number of rows migrated.
+    """
+    pages = WebPage.__table__
+    migrated = 0
+    while True:
+        with get_engine().begin() as conn:
+            rows = [dict(row._mapping) for row in conn.execute(
+                select(pages.c.id, pages.c.page_url, pages.c.content)
+                .where(pages.c.content_hash == None, pages.c.content != None)
+                .order_by(pages.c.id).limit(batch_size))]
+            if not rows:
+                break
+            store_page_bodies(conn, rows)
+            for row in rows:
+                conn.execute(pages.update().where(pages.c.id == row['id'])
+                             .values(content=None, content_hash=row['content_hash']))
+        migrated += len(rows)
+        logger.info(f"Migrated {migrated} web pages to the page store")
+    return migrated
+
+def storage_stats():
+    """
+    Returns how much the page store saves: pages, distinct bodies, raw and stored bytes.
+    """
+    bodies = PageBody.__table__
+    with get_engine().connect() as conn:
+        pages = conn.execute(select(func.count()).select_from(WebPage.__table__)).scalar()
+        count, raw_bytes, stored_bytes, deltas = conn.execute(
+            select(func.count(), func.coalesce(func.sum(bodies.c.raw_size), 0),
+                   func.coalesce(func.sum(func.length(bodies.c.data)), 0),
+                   func.count(bodies.c.base_hash))).one()
+    return {'web_pages': pages, 'bodies': count, 'delta_bodies': deltas, 'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes, 'ratio': raw_bytes / stored_bytes if stored_bytes else None}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain the compressed web page store.')
+    parser.add_argument('--migrate', action='store_true', help='Move inline web_pages.content into page_bodies.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.migrate:
+        print(f"Migrated {migrate_page_contents()} web pages")
+    print(storage_stats())
@@ -1,8 +1,11 @@
 from bs4 import BeautifulSoup
 import logging
+from .html_text import ParsedPage, parse_page
 
 logger = logging.getLogger(__name__)
 
+WAIT_TIME_KEYWORDS = ['wait time', 'waiting time', 'ER wait time', 'emergency room wait time']
+
 def extract_sitemap_urls(soup):
     urls = [loc.get_text() for loc in soup.find_all('loc')]
     logger.info(f"Extracted sitemap URLs: {urls}")
@@ -14,18 +17,16 @@ def extract_search_results(soup):
     return results
 
 def extract_wait_times(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    wait_time_keywords = ['wait time', 'waiting time', 'ER wait time', 'emergency room wait time']
-    
-    for keyword in wait_time_keywords:
-        for tag in soup.find_all(text=lambda text: text and keyword in text.lower()):
-            if tag.parent:
-                text = tag.parent.get_text(separator=' ', strip=True)
-                numbers = [int(s) for s in text.split() if s.isdigit()]
-                if numbers:
-                    wait_time = f"{numbers[0]} minutes"
-                    logger.info(f"Extracted wait time: {wait_time}")
-                    return wait_time
+    # Accept an already parsed page so callers that also need its text or links parse it only once
+    page = html_content if isinstance(html_content, ParsedPage) else parse_page(html_content, WAIT_TIME_KEYWORDS)
+
+    for keyword in WAIT_TIME_KEYWORDS:
+        for index in page.keyword_hits.get(keyword, []):
+            numbers = [int(s) for s in page.blocks[index].split() if s.isdigit()]
+            if numbers:
+                wait_time = f"{numbers[0]} minutes"
+                logger.info(f"Extracted wait time: {wait_time}")
+                return wait_time
     
     logger.info("No wait time found")
     return None
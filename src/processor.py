@@ -1,6 +1,6 @@
 import logging
 import re
-from bs4 import BeautifulSoup
+from .html_text import ParsedPage, parse_page
 from .database import get_unprocessed_html, update_processed_status
 
 logger = logging.getLogger(__name__)
@@ -10,15 +10,14 @@ def extract_wait_times(html_content):
     Extracts potential wait times from the HTML content.
 
     Args:
-        html_content (str): The raw HTML content of a page.
+        html_content (str or ParsedPage): The raw HTML content of a page, or the page already parsed.
 
     Returns:
         list of dict: A list of dictionaries containing potential wait times and their corresponding contexts.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
-    text_content = soup.get_text(separator=' ')
-    
-    print(text_content)
+    page = html_content if isinstance(html_content, ParsedPage) else parse_page(html_content)
+    text_content = page.text
+
     wait_times = []
     for match in re.finditer(r'\b(\d+)\s*(minutes?|hours?)\b', text_content, re.IGNORECASE):
         context = text_content[max(0, match.start() - 30):match.end() + 30]
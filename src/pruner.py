@@ -0,0 +1,119 @@
+import logging
+import re
+from .parser import WAIT_TIME_KEYWORDS
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the whole user prompt, and the completion limit passed to the model
+INPUT_TOKEN_BUDGET = 2000
+OUTPUT_TOKEN_LIMIT = 256
+
+# Lines kept on each side of a line mentioning a keyword or a duration
+WINDOW_LINES = 3
+
+# Average characters per token, used when no tokenizer is installed
+CHARS_PER_TOKEN = 4
+
+BOILERPLATE_PATTERNS = [
+    re.compile(r'^\s*!\[[^\]]*\]\([^)]*\)\s*$'),  # Standalone images
+    re.compile(r'©|&copy;|\ball rights reserved\b|\bprivacy (?:policy|practices)\b|\bterms (?:of use|and conditions)\b|\bcookie', re.IGNORECASE),
+    re.compile(r'^\s*(?:skip to (?:main )?content|menu|search|close|toggle navigation|back to top)\s*$', re.IGNORECASE),
+    re.compile(r'^\s*(?:[-*=_|]\s*){3,}$'),  # Markdown rules and table separators
+]
+
+MARKDOWN_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+DURATION = re.compile(r'\b\d{1,3}\s*(?:minutes?|mins?|hours?|hrs?)\b|\b\d{1,2}:\d{2}\b', re.IGNORECASE)
+
+_encoding = None
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates from length.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except ImportError:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def is_boilerplate(line):
+    if any(pattern.search(line) for pattern in BOILERPLATE_PATTERNS):
+        return True
+    # Navigation menus are lines that are almost entirely links
+    links = MARKDOWN_LINK.findall(line)
+    if len(links) >= 2:
+        remaining = MARKDOWN_LINK.sub('', line)
+        return len(re.sub(r'[\W_]+', '', remaining)) < 10
+    return False
+
+def prune_content(content, keywords=None, window_lines=WINDOW_LINES):
+    """
+    Keeps only the parts of a page around wait-time keywords and durations.
+
+    Args:
+        content (str): Page content in markdown or plain text.
+        keywords (list, optional): Extra keywords, e.g. the crawl keywords from main().
+        window_lines (int): Lines of context kept around each hit.
+
+    Returns:
+        str: The pruned content. Falls back to the de-boilerplated page when nothing matches.
+    """
+    terms = {k.lower() for k in WAIT_TIME_KEYWORDS + list(keywords or []) + ['wait']}
+    keyword_re = re.compile('|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+
+    lines = [MARKDOWN_LINK.sub(r'\1', line).strip() for line in content.splitlines() if not is_boilerplate(line)]
+    lines = [line for line in lines if line]
+
+    keep = set()
+    for i, line in enumerate(lines):
+        if keyword_re.search(line) or DURATION.search(line):
+            keep.update(range(max(0, i - window_lines), min(len(lines), i + window_lines + 1)))
+    if not keep:
+        return '\n'.join(lines)
+
+    pruned = []
+    previous = None
+    for i in sorted(keep):
+        if previous is not None and i != previous + 1:
+            pruned.append('...')
+        pruned.append(lines[i])
+        previous = i
+    return '\n'.join(pruned)
+
+def fit_to_budget(text, max_tokens):
+    """
+    Truncates text on line boundaries so it fits in max_tokens.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    low, high = 0, len(lines)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens('\n'.join(lines[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    if low == 0:
+        # A single oversized line, cut it by characters instead
+        return text[:max_tokens * CHARS_PER_TOKEN // 2]
+    logger.info(f"Truncated content from {len(lines)} to {low} lines to fit {max_tokens} tokens")
+    return '\n'.join(lines[:low])
+
+def build_prompt(template, content, keywords=None, budget=INPUT_TOKEN_BUDGET, **fields):
+    """
+    Prunes content and formats it into template within the token budget.
+
+    The template's {markdown_content} or {html_content} field receives the content.
+    """
+    field = 'html_content' if '{html_content}' in template else 'markdown_content'
+    if '{keywords}' in template:
+        fields['keywords'] = keywords
+    overhead = count_tokens(template.format(**{field: ''}, **fields))
+    content = fit_to_budget(prune_content(content, keywords), max(budget - overhead, 0))
+    return template.format(**{field: content}, **fields)
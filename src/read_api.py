@@ -0,0 +1,277 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from sqlalchemy import select
+from . import metrics
+from .database import get_engine, HospitalUrl, LatestWaitTime, FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of latest_wait_times for new readings
+REFRESH_INTERVAL = 2.0
+# Each poll re-reads readings this far behind the newest one seen, so rows a buffered writer
+# (or a worker with a slow clock) commits late are still picked up
+REFRESH_OVERLAP = timedelta(seconds=max(60, 4 * FLUSH_INTERVAL))
+# Seconds between full reloads, which also pick up renamed and removed hospitals
+FULL_REFRESH_INTERVAL = 600
+
+# Responses smaller than this aren't worth compressing
+GZIP_MIN_SIZE = 256
+GZIP_LEVEL = 6
+
+HOSPITAL_PATH = re.compile(r'^/wait-times/(\d+)$')
+
+class Body:
+    """
+    A response rendered once per change: JSON bytes, their gzip encoding and an ETag.
+    """
+    __slots__ = ('data', 'gzipped', 'etag', 'gzip_etag')
+
+    def __init__(self, payload):
+        self.data = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        digest = hashlib.blake2b(self.data, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+        # Each encoding gets its own strong ETag, caches must not hand gzip bytes to a client that can't read them
+        self.gzipped = gzip.compress(self.data, GZIP_LEVEL, mtime=0) if len(self.data) >= GZIP_MIN_SIZE else None
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    def matches(self, if_none_match):
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return self.etag in tags or self.gzip_etag in tags
+
+NOT_FOUND = Body({'error': 'unknown hospital'})
+
+def accepts_gzip(accept_encoding):
+    """
+    Reads an Accept-Encoding header. gzip;q=0 refuses gzip, and * covers it when it isn't listed.
+    """
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+# Everything a request reads, replaced as a whole so it never mixes two refreshes
+SnapshotState = namedtuple('SnapshotState', ['records', 'bodies', 'bulk', 'refreshed_at'])
+
+def _record(row):
+    return {
+        'hospital_id': row.hospital_id,
+        'hospital_name': row.hospital_name,
+        'wait_time': row.wait_time,
+        'fetched_at': row.fetched_at.isoformat(),
+    }
+
+class Snapshot:
+    """
+    The latest wait time of every hospital, with its responses already rendered.
+
+    Readers only look up dicts: refresh() builds a new SnapshotState on the
+    side and swaps it in with one assignment, so a request never waits for a
+    refresh, touches the database or sees half of an update. Refreshes are incremental, re-rendering
+    only hospitals whose reading changed plus the bulk response.
+    """
+
+    def __init__(self):
+        # records: hospital_id -> record dict, bodies: hospital_id -> Body
+        self.state = SnapshotState({}, {}, Body({'generated_at': None, 'hospitals': []}), None)
+        self.watermark = None  # Newest fetched_at seen
+        self.loaded_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def records(self):
+        return self.state.records
+
+    @property
+    def bodies(self):
+        return self.state.bodies
+
+    @property
+    def bulk(self):
+        return self.state.bulk
+
+    @property
+    def refreshed_at(self):
+        return self.state.refreshed_at
+
+    def _query(self, since=None):
+        query = (select(LatestWaitTime.hospital_id, HospitalUrl.hospital_name,
+                        LatestWaitTime.wait_time, LatestWaitTime.fetched_at)
+                 .join(HospitalUrl, HospitalUrl.id == LatestWaitTime.hospital_id))
+        if since is not None:
+            # latest_wait_times has one row per hospital, so this stays cheap without an index
+            query = query.where(LatestWaitTime.fetched_at > since)
+        with get_engine().connect() as conn:
+            return conn.execute(query).all()
+
+    def refresh(self, full=False):
+        """
+        Loads changed readings into the snapshot, everything if full is set or nothing is loaded yet.
+
+        Returns:
+            int: The number of hospitals whose response changed.
+        """
+        with self._refresh_lock:
+            full = full or self.watermark is None
+            rows = self._query(None if full else self.watermark - REFRESH_OVERLAP)
+            state = self.state
+            old_records, old_bodies = state.records, state.bodies
+            records = {} if full else dict(old_records)
+            bodies = {} if full else dict(old_bodies)
+            changed = 0
+            for row in rows:
+                record = _record(row)
+                if old_records.get(row.hospital_id) == record:
+                    # Re-read by the overlap or a full reload but unchanged, keep the rendered response
+                    records[row.hospital_id] = record
+                    bodies[row.hospital_id] = old_bodies[row.hospital_id]
+                    continue
+                records[row.hospital_id] = record
+                bodies[row.hospital_id] = Body(record)
+                changed += 1
+            if full:
+                changed += len(set(old_records) - set(records))
+            watermark = max((row.fetched_at for row in rows), default=None)
+            if watermark is not None and (self.watermark is None or full or watermark > self.watermark):
+                self.watermark = watermark
+
+            now = datetime.now()
+            if changed:
+                bulk = Body({'generated_at': now.isoformat(),
+                             'hospitals': [records[hospital_id] for hospital_id in sorted(records)]})
+                self.state = SnapshotState(records, bodies, bulk, now)
+                logger.info(f"Snapshot updated {changed} hospitals, {len(records)} in total")
+            else:
+                self.state = state._replace(refreshed_at=now)
+            if full:
+                self.loaded_at = time.monotonic()
+            metrics.incr('snapshot_refreshes', full=full)
+            return changed
+
+    def refresh_forever(self, interval=REFRESH_INTERVAL, full_interval=FULL_REFRESH_INTERVAL, stop=None):
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            try:
+                self.refresh(full=time.monotonic() - self.loaded_at >= full_interval)
+            except Exception as e:
+                # Keep serving the last good snapshot until the database is back
+                logger.error(f"Failed to refresh wait time snapshot: {e}")
+                metrics.incr('errors', stage='snapshot')
+
+    def start(self, interval=REFRESH_INTERVAL, full_interval=FULL_REFRESH_INTERVAL):
+        self.refresh(full=True)
+        thread = threading.Thread(target=self.refresh_forever, args=(interval, full_interval),
+                                  name='snapshot-refresh', daemon=True)
+        thread.start()
+        return thread
+
+def make_handler(snapshot, max_age=int(REFRESH_INTERVAL)):
+    class WaitTimeHandler(BaseHTTPRequestHandler):
+        # Keep-alive, so clients polling many hospitals reuse one connection
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes, without TCP_NODELAY the body waits ~40ms on a delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body):
+            self.send_response(status)
+            gzipped = body.gzipped is not None and accepts_gzip(self.headers.get('Accept-Encoding', ''))
+            self.send_header('ETag', body.gzip_etag if gzipped else body.etag)
+            self.send_header('Cache-Control', f'public, max-age={max_age}')
+            self.send_header('Vary', 'Accept-Encoding')
+            if status == 304:
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            data = body.gzipped if gzipped else body.data
+            self.send_header('Content-Type', 'application/json')
+            if gzipped:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            state = snapshot.state
+            if path == '/wait-times':
+                endpoint, body = 'bulk', state.bulk
+            elif path == '/healthz':
+                refreshed_at = state.refreshed_at
+                endpoint, body = 'health', Body({'hospitals': len(state.records),
+                                                 'refreshed_at': refreshed_at.isoformat() if refreshed_at else None})
+            else:
+                match = HOSPITAL_PATH.match(path)
+                if match is None:
+                    self.send_error(404)
+                    return
+                endpoint, body = 'hospital', state.bodies.get(int(match.group(1)))
+                if body is None:
+                    metrics.incr('api_requests', endpoint=endpoint, status=404)
+                    self._send(404, NOT_FOUND)
+                    return
+            if_none_match = self.headers.get('If-None-Match')
+            status = 304 if if_none_match and body.matches(if_none_match) else 200
+            metrics.incr('api_requests', endpoint=endpoint, status=status)
+            self._send(status, body)
+
+        do_HEAD = do_GET
+
+    return WaitTimeHandler
+
+def serve(port, host='127.0.0.1', snapshot=None, interval=REFRESH_INTERVAL):
+    """
+    Loads the snapshot and serves it from a daemon thread:
+
+        GET /wait-times       every hospital's latest wait time
+        GET /wait-times/<id>  one hospital's
+        GET /healthz          snapshot size and age
+
+    Returns:
+        tuple: (ThreadingHTTPServer, Snapshot), call shutdown() on the server to stop it.
+    """
+    snapshot = snapshot or Snapshot()
+    snapshot.start(interval)
+    server = ThreadingHTTPServer((host, port), make_handler(snapshot, max(1, int(interval))))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='read-api', daemon=True).start()
+    logger.info(f"Serving wait times for {len(snapshot.records)} hospitals on http://{host}:{server.server_address[1]}")
+    return server, snapshot
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve current wait times from an in-memory snapshot.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--interval', type=float, default=REFRESH_INTERVAL, help='Seconds between snapshot refreshes.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server, _ = serve(args.port, args.host, interval=args.interval)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,231 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from . import http_client
+from .backends import Backend, get_factory, register_backend, reset_backends
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes, replaying an older corpus then fails loudly
+CORPUS_VERSION = 1
+
+def _key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+class Corpus:
+    """
+    A versioned directory of recorded HTTP and LLM responses.
+
+    Layout: manifest.json, hospitals.json, an optional labels.json with
+    ground-truth wait times (hospital URL -> minutes), and one JSON file per
+    response under http/ and llm/.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        manifest_path = os.path.join(directory, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            if self.manifest.get('version') != CORPUS_VERSION:
+                raise ValueError(f"Corpus {directory} is version {self.manifest.get('version')}, "
+                                 f"expected {CORPUS_VERSION}")
+        else:
+            self.manifest = {'version': CORPUS_VERSION, 'created_at': datetime.now().isoformat()}
+            self._write(manifest_path, self.manifest)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per process and thread, worker processes record into the same corpus
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _http_path(self, method, url):
+        return os.path.join(self.directory, 'http', _key(method, url) + '.json')
+
+    def _llm_path(self, model, system_prompt, text, max_tokens, json_mode=None):
+        # json_mode is None for complete(), streams are keyed apart from completions and by JSON mode
+        parts = (model, system_prompt, text, max_tokens) + (() if json_mode is None else ('stream', json_mode))
+        return os.path.join(self.directory, 'llm', _key(*parts) + '.json')
+
+    def save_http(self, method, url, response):
+        self._write(self._http_path(method, url), {
+            'method': method,
+            'url': url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'body': base64.b64encode(response.content).decode('ascii'),
+        })
+
+    def load_http(self, method, url):
+        return self._read(self._http_path(method, url))
+
+    def save_llm(self, model, system_prompt, text, max_tokens, output, json_mode=None, chunks=None):
+        entry = {'model': model, 'max_tokens': max_tokens, 'output': output}
+        if json_mode is not None:
+            entry.update(json_mode=json_mode, chunks=chunks)
+        self._write(self._llm_path(model, system_prompt, text, max_tokens, json_mode), entry)
+
+    def load_llm(self, model, system_prompt, text, max_tokens, json_mode=None):
+        return self._read(self._llm_path(model, system_prompt, text, max_tokens, json_mode))
+
+    def save_hospitals(self, hospitals):
+        self._write(os.path.join(self.directory, 'hospitals.json'), [list(row) for row in hospitals])
+
+    def load_hospitals(self):
+        return [tuple(row) for row in self._read(os.path.join(self.directory, 'hospitals.json')) or []]
+
+    def load_labels(self):
+        return self._read(os.path.join(self.directory, 'labels.json')) or {}
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests normally and saves every response to the corpus.
+    """
+
+    def __init__(self, corpus, **kwargs):
+        super().__init__(**kwargs)
+        self.corpus = corpus
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.corpus.save_http(request.method, request.url, response)
+        return response
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Serves responses from the corpus and never touches the network.
+    """
+
+    def __init__(self, corpus):
+        super().__init__()
+        self.corpus = corpus
+
+    def send(self, request, **kwargs):
+        entry = self.corpus.load_http(request.method, request.url)
+        if entry is None:
+            raise requests.ConnectionError(f"No recorded response for {request.method} {request.url}", request=request)
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = base64.b64decode(entry['body'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+class RecordingBackend(Backend):
+    def __init__(self, inner, corpus):
+        self.inner = inner
+        self.corpus = corpus
+        self.name = inner.name
+        self.model = inner.model
+
+    def complete(self, text, system_prompt, max_tokens):
+        output = self.inner.complete(text, system_prompt, max_tokens)
+        self.corpus.save_llm(self.model, system_prompt, text, max_tokens, output)
+        return output
+
+    def stream(self, text, system_prompt, max_tokens, json_mode=False):
+        chunks = []
+        inner = self.inner.stream(text, system_prompt, max_tokens, json_mode=json_mode)
+        try:
+            for chunk in inner:
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # Also saved when the caller stops reading early, replay then serves what it read
+            inner.close()
+            if sys.exc_info()[0] in (None, GeneratorExit):
+                self.corpus.save_llm(self.model, system_prompt, text, max_tokens, ''.join(chunks),
+                                     json_mode, chunks)
+
+class ReplayBackend(Backend):
+    def __init__(self, name, model, corpus):
+        self.name = name
+        self.model = model
+        self.corpus = corpus
+
+    def complete(self, text, system_prompt, max_tokens):
+        entry = self.corpus.load_llm(self.model, system_prompt, text, max_tokens)
+        if entry is None:
+            raise KeyError(f"No recorded {self.name} response for this prompt")
+        return entry['output']
+
+    def stream(self, text, system_prompt, max_tokens, json_mode=False):
+        entry = self.corpus.load_llm(self.model, system_prompt, text, max_tokens, json_mode)
+        if entry is None:
+            raise KeyError(f"No recorded {self.name} stream for this prompt")
+        yield from entry['chunks']
+
+def default_backend_models():
+    """
+    Returns backend name -> model name for every backend extractions can reach: the router's
+    providers, which it looks up by name, and groq and mistral, which are also called directly.
+    """
+    from .backends import GroqBackend, OllamaBackend
+    from .local_model import MISTRAL_MODEL
+    from .llm_router import PROVIDERS
+    models = {'groq': GroqBackend.model, 'ollama': OllamaBackend.model, 'mistral': MISTRAL_MODEL}
+    names = [name.strip() for name in PROVIDERS.split(',') if name.strip()] + ['groq', 'mistral']
+    return {name: models[name] for name in dict.fromkeys(names) if name in models}
+
+def install(mode, directory, backend_models=None):
+    """
+    Routes HTTP traffic and model backends through a corpus.
+
+    Args:
+        mode (str): 'record' to capture live responses, 'replay' to serve them offline.
+        directory (str): The corpus directory.
+        backend_models (dict, optional): Backend name -> model name, for backends to record/replay.
+            Defaults to every provider the LLM router uses (llm_router.PROVIDERS) plus groq and mistral.
+
+    Returns:
+        Corpus: The corpus in use.
+    """
+    backend_models = backend_models or default_backend_models()
+    corpus = Corpus(directory)
+    if mode == 'record':
+        http_client.mount(RecordingAdapter(corpus, pool_connections=http_client.POOL_CONNECTIONS,
+                                           pool_maxsize=http_client.POOL_MAXSIZE,
+                                           max_retries=http_client.build_retry()))
+        for name in backend_models:
+            factory = get_factory(name)
+            register_backend(name, lambda factory=factory: RecordingBackend(factory(), corpus))
+    elif mode == 'replay':
+        http_client.mount(ReplayAdapter(corpus))
+        for name, model in backend_models.items():
+            register_backend(name, lambda name=name, model=model: ReplayBackend(name, model, corpus))
+    else:
+        raise ValueError(f"Unknown replay mode {mode!r}")
+    reset_backends()
+    logger.info(f"Installed {mode} corpus at {directory}")
+    return corpus
@@ -0,0 +1,157 @@
+import hashlib
+import heapq
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from .database import get_schedule, update_schedule
+
+logger = logging.getLogger(__name__)
+
+# Refresh intervals in seconds
+DEFAULT_INTERVAL = 15 * 60
+MIN_INTERVAL = 2 * 60
+MAX_INTERVAL = 6 * 60 * 60
+MAX_BACKOFF = 24 * 60 * 60
+
+# Multipliers applied to a hospital's interval after each successful refresh
+CHANGED_FACTOR = 0.5
+UNCHANGED_FACTOR = 1.5
+
+def parse_failures(status):
+    # Failures are kept in HospitalUrl.status as "error:<count>"
+    if status and status.startswith('error:'):
+        try:
+            return int(status.split(':', 1)[1])
+        except ValueError:
+            return 0
+    return 0
+
+def wait_times(pages):
+    return sorted(page['wait_time_minutes'] for page in pages or [] if page.get('wait_time_minutes') is not None)
+
+def result_signature(pages):
+    """
+    Hashes the wait times extracted for a hospital, so the next refresh can tell whether they changed.
+
+    Only the minutes count, the raw model output differs between runs (snippets, confidence) for the same wait.
+    """
+    digest = hashlib.sha256()
+    for minutes in wait_times(pages):
+        digest.update(f'{minutes},'.encode('utf-8'))
+    return digest.hexdigest()
+
+def reschedule(entry, pages, now, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    """
+    Applies a refresh attempt to a schedule entry.
+
+    Args:
+        entry (dict): The hospital's 'interval', 'failures' and 'signature', updated in place.
+        pages (list or None): The processed pages, or None if the refresh failed. Pages without
+            any wait time count as a failure too.
+        now (datetime): When the attempt finished.
+
+    Returns:
+        tuple: (next_fetch_at, status) to store in hospital_urls.
+    """
+    if not wait_times(pages):
+        entry['failures'] += 1
+        delay = min(MAX_BACKOFF, entry['interval'] * 2 ** entry['failures'])
+        delay *= random.uniform(0.8, 1.2)
+        status = f"error:{entry['failures']}"
+    else:
+        signature = result_signature(pages)
+        if entry['signature'] is not None:
+            factor = UNCHANGED_FACTOR if signature == entry['signature'] else CHANGED_FACTOR
+            entry['interval'] = int(min(max_interval, max(min_interval, entry['interval'] * factor)))
+        entry['signature'] = signature
+        entry['failures'] = 0
+        delay = entry['interval']
+        status = 'ok'
+    return now + timedelta(seconds=delay), status
+
+class RefreshScheduler:
+    """
+    Priority queue of hospitals ordered by when they are next due.
+
+    Each hospital's interval halves when a refresh finds a different wait time
+    and grows by half when nothing changed, within [MIN_INTERVAL, MAX_INTERVAL].
+    Failures, including refreshes that found no wait time, back off
+    exponentially and are counted in HospitalUrl.status.
+    The schedule is written back to hospital_urls, so a restarted scheduler
+    carries on where it left off.
+    """
+
+    def __init__(self, default_interval=DEFAULT_INTERVAL, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._heap = []
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Adds hospitals that aren't scheduled yet. Safe to call repeatedly to pick up new rows.
+        """
+        now = datetime.now()
+        added = 0
+        with self._lock:
+            for hospital_id, hospital_url, next_fetch_at, refresh_interval, status, signature in get_schedule():
+                if hospital_id in self._entries:
+                    continue
+                self._entries[hospital_id] = {
+                    'url': hospital_url,
+                    'interval': refresh_interval or self.default_interval,
+                    'failures': parse_failures(status),
+                    'signature': signature,
+                }
+                heapq.heappush(self._heap, (next_fetch_at or now, hospital_id))
+                added += 1
+        if added:
+            logger.info(f"Scheduled {added} hospitals")
+        return added
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pop_due(self, now=None, limit=None):
+        """
+        Removes and returns (hospital_id, hospital_url) for hospitals due by now, soonest first.
+
+        Popped hospitals stay out of the queue until record_result() reschedules them.
+        """
+        now = now or datetime.now()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(due) < limit):
+                _, hospital_id = heapq.heappop(self._heap)
+                due.append((hospital_id, self._entries[hospital_id]['url']))
+        return due
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.now()
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, (self._heap[0][0] - now).total_seconds())
+
+    def record_result(self, hospital_id, pages, now=None):
+        """
+        Reschedules a hospital after a refresh attempt.
+
+        Args:
+            hospital_id (int): The hospital that was refreshed.
+            pages (list or None): The processed pages, or None if the refresh failed.
+
+        Returns:
+            datetime: When the hospital is next due.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            entry = self._entries[hospital_id]
+            next_fetch_at, status = reschedule(entry, pages, now, self.min_interval, self.max_interval)
+            heapq.heappush(self._heap, (next_fetch_at, hospital_id))
+            interval, signature = entry['interval'], entry['signature']
+        update_schedule(hospital_id, next_fetch_at, interval, status, signature)
+        return next_fetch_at
@@ -0,0 +1,131 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The object the LLM is asked to return for a page
+WAIT_TIME_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'wait_time_minutes': {'type': ['integer', 'null'], 'minimum': 0, 'maximum': 1440,
+                              'description': 'The current live wait time in minutes, or null if the page has none.'},
+        'confidence': {'type': 'number', 'minimum': 0, 'maximum': 1},
+        'source_snippet': {'type': ['string', 'null'],
+                           'description': 'The exact text on the page the wait time was read from.'},
+    },
+    'required': ['wait_time_minutes', 'confidence', 'source_snippet'],
+    'additionalProperties': False,
+}
+
+MAX_WAIT_MINUTES = 24 * 60
+MAX_SNIPPET_LENGTH = 300
+
+class JSONObjectScanner:
+    """
+    Finds the end of the first top-level JSON object in text that arrives in chunks.
+
+    Tracks brace depth outside of strings, so the caller can stop reading a
+    stream as soon as the object is complete instead of waiting for the model
+    to finish.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.start = None
+        self.length = 0
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of text.
+
+        Returns:
+            str or None: The complete object text once its closing brace has arrived.
+        """
+        for i, char in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth:
+                self.in_string = True
+            elif char == '{':
+                if self.depth == 0:
+                    self.start = self.length + i
+                self.depth += 1
+            elif char == '}' and self.depth:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.parts.append(chunk[:i + 1])
+                    return ''.join(self.parts)[self.start:]
+        self.parts.append(chunk)
+        self.length += len(chunk)
+        return None
+
+def read_json_object(chunks):
+    """
+    Reads chunks until the first JSON object is complete, then closes the stream.
+
+    Args:
+        chunks (iterator): Text chunks, e.g. from Backend.stream(). Generators are closed
+            early, which ends the underlying HTTP response.
+
+    Returns:
+        tuple: (object text or None if the stream ended first, whether the stream was cut short)
+    """
+    scanner = JSONObjectScanner()
+    try:
+        for chunk in chunks:
+            text = scanner.feed(chunk)
+            if text is not None:
+                return text, True
+        return None, False
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+def validate_wait_time(data):
+    """
+    Checks a decoded object against WAIT_TIME_SCHEMA.
+
+    Returns:
+        dict or None: wait_time_minutes (int or None), confidence (float) and source_snippet,
+        or None if the object doesn't match the schema or the values are out of range.
+        A missing key or a non-integer wait time (e.g. 22.5 or "20") is invalid, "no wait
+        time" must be an explicit null.
+    """
+    if not isinstance(data, dict) or any(key not in data for key in WAIT_TIME_SCHEMA['required']):
+        return None
+    minutes = data['wait_time_minutes']
+    confidence = data['confidence']
+    snippet = data['source_snippet']
+    if minutes is not None:
+        if isinstance(minutes, bool) or not isinstance(minutes, int):
+            return None
+        if not 0 <= minutes <= MAX_WAIT_MINUTES:
+            return None
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+        return None
+    if snippet is not None and not isinstance(snippet, str):
+        return None
+    return {
+        'wait_time_minutes': minutes,
+        'confidence': float(confidence),
+        'source_snippet': snippet[:MAX_SNIPPET_LENGTH] if snippet else None,
+    }
+
+def parse_wait_time_json(text):
+    """
+    Decodes and validates a structured extraction. Returns None if it is not valid.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    return validate_wait_time(data)
@@ -0,0 +1,83 @@
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select
+from .database import Session, HospitalUrl, WaitTime, LatestWaitTime
+
+logger = logging.getLogger(__name__)
+
+def _percentile(sorted_values, q):
+    # Nearest-rank percentile on an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def latest_wait_times(hospital_ids=None):
+    """
+    Returns the current wait time for every hospital (or the given ones).
+
+    Reads latest_wait_times, which has one row per hospital, so this never
+    scans the wait_times history.
+
+    Returns:
+        list of dict: {'hospital_id', 'hospital_name', 'wait_time', 'fetched_at'}.
+    """
+    session = Session()
+    try:
+        query = (select(LatestWaitTime.hospital_id, HospitalUrl.hospital_name,
+                        LatestWaitTime.wait_time, LatestWaitTime.fetched_at)
+                 .join(HospitalUrl, HospitalUrl.id == LatestWaitTime.hospital_id))
+        if hospital_ids is not None:
+            query = query.where(LatestWaitTime.hospital_id.in_(list(hospital_ids)))
+        return [dict(row._mapping) for row in session.execute(query)]
+    except Exception as e:
+        logger.error(f"Failed to fetch latest wait times: {e}")
+        return []
+    finally:
+        session.close()
+
+def wait_time_range(hospital_id, start, end=None):
+    """
+    Returns (fetched_at, wait_time) readings for a hospital in [start, end), oldest first.
+
+    Served by the (hospital_id, fetched_at) index.
+    """
+    end = end or datetime.now()
+    session = Session()
+    try:
+        query = (select(WaitTime.fetched_at, WaitTime.wait_time)
+                 .where(WaitTime.hospital_id == hospital_id,
+                        WaitTime.fetched_at >= start,
+                        WaitTime.fetched_at < end)
+                 .order_by(WaitTime.fetched_at))
+        return [tuple(row) for row in session.execute(query)]
+    except Exception as e:
+        logger.error(f"Failed to fetch wait times for hospital {hospital_id}: {e}")
+        return []
+    finally:
+        session.close()
+
+def hourly_wait_times(hospital_id, start, end=None):
+    """
+    Downsamples a hospital's readings to one row per hour.
+
+    Returns:
+        list of dict: {'hour', 'count', 'p50', 'p95', 'min', 'max'}, oldest first.
+    """
+    buckets = defaultdict(list)
+    for fetched_at, wait_time in wait_time_range(hospital_id, start, end):
+        buckets[fetched_at.replace(minute=0, second=0, microsecond=0)].append(wait_time)
+    hours = []
+    for hour in sorted(buckets):
+        values = sorted(buckets[hour])
+        hours.append({
+            'hour': hour,
+            'count': len(values),
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'min': values[0],
+            'max': values[-1],
+        })
+    return hours
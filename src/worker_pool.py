@@ -0,0 +1,222 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from . import metrics
+from .database import init_db, claim_hospitals, renew_leases, complete_lease, release_leases, BufferedWriter
+from .scheduler import reschedule, parse_failures, DEFAULT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Worker processes per machine, and hospitals each of them works on at once
+WORKERS = os.cpu_count() or 1
+THREADS_PER_WORKER = 8
+
+# A lease is renewed every HEARTBEAT_INTERVAL seconds, a worker that stops renewing loses it after LEASE_SECONDS
+LEASE_SECONDS = 300
+HEARTBEAT_INTERVAL = 60
+
+# How long an idle daemon worker waits before looking for due hospitals again
+POLL_INTERVAL = 30
+
+# Crashed workers are restarted after RESTART_DELAY seconds, at most MAX_RESTARTS times per pool
+RESTART_DELAY = 5
+MAX_RESTARTS = 20
+
+def worker_name(index):
+    return f"{socket.gethostname()}-w{index}-{uuid.uuid4().hex[:8]}"
+
+class Worker:
+    """
+    Processes hospitals leased from the shared hospital_urls queue.
+
+    Any number of workers, in any number of processes or machines, can share
+    one database: claim_hospitals() hands each due hospital to exactly one of
+    them. A heartbeat thread keeps the worker's leases alive while it works,
+    and finishing a hospital reschedules it and releases the lease in one
+    UPDATE that only succeeds if the worker still holds the lease.
+    """
+
+    def __init__(self, owner, threads=THREADS_PER_WORKER, lease_seconds=LEASE_SECONDS,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, poll_interval=POLL_INTERVAL):
+        self.owner = owner
+        self.threads = threads
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self._leased = {}  # hospital_id -> schedule entry, see scheduler.reschedule
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                hospital_ids = list(self._leased)
+            held = renew_leases(self.owner, hospital_ids, self.lease_seconds)
+            if held < len(hospital_ids):
+                logger.warning(f"{self.owner} lost {len(hospital_ids) - held} of {len(hospital_ids)} leases")
+
+    def _claim(self, limit):
+        claimed = []
+        for hospital_id, hospital_url, refresh_interval, status, signature in claim_hospitals(
+                self.owner, limit, self.lease_seconds):
+            with self._lock:
+                self._leased[hospital_id] = {
+                    'interval': refresh_interval or DEFAULT_INTERVAL,
+                    'failures': parse_failures(status),
+                    'signature': signature,
+                }
+            claimed.append((hospital_id, hospital_url))
+        metrics.incr('leases_claimed', len(claimed))
+        return claimed
+
+    def _finish(self, hospital_id, pages):
+        with self._lock:
+            entry = self._leased.pop(hospital_id)
+        next_fetch_at, status = reschedule(entry, pages, datetime.now())
+        if not complete_lease(self.owner, hospital_id, next_fetch_at, entry['interval'], status, entry['signature']):
+            logger.warning(f"Lease on hospital {hospital_id} expired before {self.owner} finished it")
+            metrics.incr('leases_lost')
+
+    def run(self, process, daemon=False):
+        """
+        Claims and processes due hospitals until none are left, or forever if daemon is set.
+
+        Args:
+            process (callable): process(hospital_id, hospital_url, writer) -> pages, or None on failure.
+            daemon (bool): Keep polling for hospitals that become due instead of returning.
+
+        Returns:
+            int: The number of hospitals processed.
+        """
+        heartbeat = threading.Thread(target=self._heartbeat, name='lease-heartbeat', daemon=True)
+        heartbeat.start()
+        processed = 0
+        try:
+            with BufferedWriter() as writer, ThreadPoolExecutor(max_workers=self.threads) as executor:
+                in_flight = {}
+                while not self._stop.is_set():
+                    if len(in_flight) < self.threads:
+                        for hospital_id, hospital_url in self._claim(self.threads - len(in_flight)):
+                            in_flight[executor.submit(process, hospital_id, hospital_url, writer)] = hospital_id
+                    if not in_flight:
+                        if not daemon:
+                            break
+                        self._stop.wait(self.poll_interval)
+                        continue
+
+                    done, _ = wait(in_flight, timeout=self.poll_interval if daemon else None,
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        hospital_id = in_flight.pop(future)
+                        try:
+                            pages = future.result()
+                        except Exception as e:
+                            logger.error(f"Error processing hospital {hospital_id}: {e}")
+                            pages = None
+                        self._finish(hospital_id, pages)
+                        processed += 1
+        finally:
+            self._stop.set()
+            # Hand back anything still leased (e.g. on shutdown) so other workers don't wait for it to expire
+            released = release_leases(self.owner)
+            if released:
+                logger.info(f"{self.owner} released {released} unfinished leases")
+        logger.info(f"{self.owner} processed {processed} hospitals")
+        return processed
+
+def worker_metrics_path(path, index):
+    # Each worker dumps its own snapshot next to the pool's, e.g. metrics.json -> metrics.w0.json
+    root, ext = os.path.splitext(path)
+    return f"{root}.w{index}{ext}"
+
+def _worker_main(owner, index, threads, daemon, settings):
+    # Runs in a fresh spawned process, so it sets up logging, replay and metrics and imports the pipeline itself
+    from .main import configure_logging, process_hospital, KEYWORDS
+    from .fetcher import enable_batching
+    from . import replay
+    configure_logging()
+    if settings.get('replay_mode'):
+        replay.install(settings['replay_mode'], settings['replay_dir'])
+    metrics_dump = settings.get('metrics_dump')
+    if settings.get('metrics_port') is not None:
+        metrics.serve(settings['metrics_port'] + 1 + index)
+    if metrics_dump:
+        metrics_dump = worker_metrics_path(metrics_dump, index)
+        metrics.start_json_dumper(metrics_dump, settings.get('metrics_interval', metrics.DUMP_INTERVAL))
+    enable_batching()
+    worker = Worker(owner, threads)
+    try:
+        worker.run(lambda hospital_id, hospital_url, writer: process_hospital(hospital_id, hospital_url, KEYWORDS,
+                                                                             writer),
+                   daemon=daemon)
+    finally:
+        if metrics_dump:
+            metrics.dump_json(metrics_dump)
+
+def run_pool(workers=WORKERS, threads=THREADS_PER_WORKER, daemon=False, settings=None):
+    """
+    Runs worker processes on this machine against the shared queue and restarts any that crash.
+
+    Run it on several machines pointed at the same PostgreSQL database to scale out.
+    A crashed worker's leases are released right away; a worker on another machine
+    that dies silently loses its leases once they expire.
+
+    Args:
+        workers (int): Number of worker processes.
+        threads (int): Hospitals each worker processes concurrently.
+        daemon (bool): Keep workers polling for due hospitals instead of exiting when the queue is empty.
+        settings (dict, optional): Installed in every worker: replay_mode and replay_dir ('record' or
+            'replay' and the corpus directory), metrics_port (worker i serves on metrics_port + 1 + i),
+            metrics_dump (worker i writes worker_metrics_path(metrics_dump, i)) and metrics_interval.
+    """
+    settings = settings or {}
+    init_db()
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    restarts = 0
+
+    def start(index):
+        owner = worker_name(index)
+        process = context.Process(target=_worker_main, args=(owner, index, threads, daemon, settings), name=owner)
+        process.start()
+        processes[process.sentinel] = (index, owner, process)
+        logger.info(f"Started worker {owner} (pid {process.pid})")
+
+    for index in range(workers):
+        start(index)
+    start_time = time.monotonic()
+    try:
+        while processes:
+            for sentinel in multiprocessing.connection.wait(list(processes)):
+                index, owner, process = processes.pop(sentinel)
+                process.join()
+                if process.exitcode == 0:
+                    logger.info(f"Worker {owner} finished")
+                    continue
+                released = release_leases(owner)
+                logger.error(f"Worker {owner} exited with code {process.exitcode}, released {released} leases")
+                metrics.incr('worker_crashes')
+                if restarts < MAX_RESTARTS:
+                    restarts += 1
+                    time.sleep(RESTART_DELAY)
+                    start(index)
+                else:
+                    logger.error(f"Not restarting worker {index}, {MAX_RESTARTS} restarts used up")
+    except KeyboardInterrupt:
+        logger.info("Stopping worker pool")
+    finally:
+        for index, owner, process in processes.values():
+            process.terminate()
+            process.join()
+            release_leases(owner)
+    logger.info(f"Worker pool finished in {time.monotonic() - start_time:.1f}s")